@@ -1,6 +1,8 @@
 import collections
 import json
 import os
+import pickle
+import re
 import shutil
 import subprocess
 import sys
@@ -9,33 +11,34 @@ import threading
 import time
 import tkinter as tk
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from tkinter import ttk, filedialog, messagebox
+from tkinter import ttk, filedialog, messagebox, font as tkfont
 from tkinter.scrolledtext import ScrolledText
 
 import cv2
-import imagehash
 import numpy as np
 import torch
-from PIL import Image
-from skimage.metrics import structural_similarity as ssim
+import torch.nn.functional as F
 
 warnings.filterwarnings('ignore')
 
-# 添加APISR项目路径
-sys.path.append('.')
+# CUDA显存分配器使用可扩展段，避免不同分辨率片段间的显存碎片（需在首次使用CUDA前设置，用户已设置时不覆盖）
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
+
+# 单调高精度计时器，所有耗时统计都用它（日志时间戳仍用time.time()）
+_t = time.perf_counter
+
+# 历史帧数量输入框按键校验：最多3位数字（允许清空）
+_HISTORY_SIZE_RE = re.compile(r'^\d{0,3}$')
 
-# 直接从architecture导入模型
-try:
-    from architecture.rrdb import RRDBNet
-    from architecture.grl import GRL
-    from architecture.dat import DAT
-    from architecture.cunet import UNet_Full
-except ImportError as e:
-    print(f"导入模型架构时出错: {e}")
-    print("请确保architecture模块在Python路径中")
-    sys.exit(1)
+# 超分后帧文件名：frame_000123.png
+_FRAME_NAME_RE = re.compile(r'^frame_(\d{6})\.png$')
+
+# 添加APISR项目路径（模型架构在首次加载对应模型时才导入，见load_rrdb等，以缩短界面启动时间）
+sys.path.append('.')
 
 from moviepy import VideoFileClip
 from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
@@ -49,6 +52,150 @@ class ModernButton(ttk.Button):
         self.configure(style='Accent.TButton')
 
 
+@dataclass
+class SegmentStats:
+    """单个片段的处理统计，按视频汇总时一次性转成numpy数组求和"""
+    dup_time: float = 0.0
+    sr_time: float = 0.0
+    frames: int = 0
+    dups: int = 0
+    elapsed: float = 0.0
+
+    def as_tuple(self):
+        return (self.dup_time, self.sr_time, self.frames, self.dups, self.elapsed)
+
+
+class HashIndex:
+    """哈希倒排索引：按分块建立桶，按汉明距离阈值快速查询
+
+    64位哈希切成 threshold+1 块，汉明距离不超过threshold的两个哈希
+    至少有一块完全相同（鸽巢原理），查询时只需检查同块桶中的哈希。
+    """
+
+    def __init__(self, threshold):
+        self.threshold = max(0, min(int(threshold), 63))
+
+        # 按块划分64位：(右移位数, 掩码)
+        n_blocks = self.threshold + 1
+        self._blocks = []
+        start = 0
+        for b in range(n_blocks):
+            width = 64 // n_blocks + (1 if b < 64 % n_blocks else 0)
+            self._blocks.append((64 - start - width, (1 << width) - 1))
+            start += width
+        self._buckets = [{} for _ in self._blocks]
+
+    def add(self, h):
+        for (shift, mask), bucket in zip(self._blocks, self._buckets):
+            counts = bucket.setdefault((h >> shift) & mask, {})
+            counts[h] = counts.get(h, 0) + 1
+
+    def remove(self, h):
+        for (shift, mask), bucket in zip(self._blocks, self._buckets):
+            key = (h >> shift) & mask
+            counts = bucket[key]
+            if counts[h] > 1:
+                counts[h] -= 1
+            else:
+                del counts[h]
+                if not counts:
+                    del bucket[key]
+
+    def query(self, h):
+        """返回索引中与h的汉明距离不超过阈值的哈希 -> 距离"""
+        matches = {}
+        for (shift, mask), bucket in zip(self._blocks, self._buckets):
+            for cand in bucket.get((h >> shift) & mask, ()):
+                if cand not in matches:
+                    dist = bin(h ^ cand).count('1')
+                    if dist <= self.threshold:
+                        matches[cand] = dist
+        return matches
+
+    def clear(self):
+        for bucket in self._buckets:
+            bucket.clear()
+
+
+class RingCache:
+    """历史帧环形缓存：按槽位存入连续的numpy数组，order（有序字典）记录从旧到新的槽位
+
+    数组按需倍增扩容（上限maxlen），满了之后新帧覆盖最旧的槽位，
+    每帧只做一次写入，不再为每条记录单独分配对象。
+    """
+
+    def __init__(self, maxlen, hash_threshold):
+        self.maxlen = maxlen
+        self.order = collections.OrderedDict()  # 槽位号 -> None，从旧到新
+        self.hash_index = HashIndex(hash_threshold)
+        self.hashes = [None] * maxlen
+        self.has_thumb = np.zeros(maxlen, dtype=bool)
+        self.idx = np.zeros(maxlen, dtype=np.int64)
+        self.gray = None  # (N, h, w) uint8，SSIM用灰度缩略图
+        self.tiny = None  # (N, 32, 32) float32，MSE早筛缩略图
+        self.sr = None  # (N, H, W, 3) uint8，超分结果
+
+    def __len__(self):
+        return len(self.order)
+
+    def clear(self, release=False):
+        """清空记录；release为False时保留已分配的数组供复用"""
+        self.order.clear()
+        self.hash_index.clear()
+        self.hashes = [None] * self.maxlen
+        self.has_thumb[:] = False
+        if release:
+            self.gray = None
+            self.tiny = None
+            self.sr = None
+
+    def _store(self, arr, slot, value):
+        """把value写入arr的slot槽位，必要时扩容"""
+        if arr is None or arr.shape[1:] != value.shape or slot >= len(arr):
+            old_len = len(arr) if arr is not None else 0
+            cap = min(self.maxlen, max(8, slot + 1, 2 * old_len))
+            grown = np.empty((cap,) + value.shape, dtype=value.dtype)
+            if old_len and arr.shape[1:] == value.shape:
+                grown[:old_len] = arr
+            arr = grown
+        arr[slot] = value
+        return arr
+
+    def push(self, frame_hash, thumbnail, sr, frame_idx):
+        """添加一帧；满了则覆盖最旧的记录"""
+        # 分辨率变化时旧记录不可再用
+        if self.sr is not None and self.sr.shape[1:] != sr.shape:
+            self.clear()
+
+        if len(self.order) < self.maxlen:
+            slot = len(self.order)
+        else:
+            slot, _ = self.order.popitem(last=False)
+            if self.hashes[slot] is not None:
+                self.hash_index.remove(self.hashes[slot])
+
+        self.sr = self._store(self.sr, slot, sr)
+        if thumbnail is not None:
+            gray, tiny = thumbnail
+            self.gray = self._store(self.gray, slot, gray)
+            self.tiny = self._store(self.tiny, slot, tiny)
+        self.has_thumb[slot] = thumbnail is not None
+
+        self.hashes[slot] = frame_hash
+        if frame_hash is not None:
+            self.hash_index.add(frame_hash)
+        self.idx[slot] = frame_idx
+        self.order[slot] = None
+
+    def touch(self, slot):
+        """把槽位移到最近位置（O(1)）"""
+        self.order.move_to_end(slot)
+
+    def newest_first(self):
+        """按从新到旧的顺序遍历槽位"""
+        return reversed(self.order)
+
+
 class APISRVideoProcessor:
     def __init__(self):
         self.root = tk.Tk()
@@ -69,9 +216,52 @@ class APISRVideoProcessor:
         self.warning_color = "#f39c12"
         self.danger_color = "#e74c3c"
 
+        # 状态栏颜色名到色值的映射
+        self._status_colors = {
+            "black": "#2c3e50",
+            "green": self.success_color,
+            "blue": self.accent_color,
+            "orange": self.warning_color,
+            "red": self.danger_color
+        }
+
         # 配置文件路径
         self.config_file = "apisr_config.json"
 
+        # 无界面批处理模式：跳过所有确认对话框，日志同时输出到终端
+        self.headless = os.environ.get('APISR_HEADLESS') == '1'
+        self.last_error = None
+
+        # 日志环形缓冲区：工作线程只入队，由Tk主线程定时批量刷新
+        self._log_q = collections.deque(maxlen=10000)
+        self._log_flush_interval = 100  # 毫秒
+        self._log_max_lines = 5000  # 日志控件最多保留的行数
+
+        # 状态栏/进度等控件的待更新值：工作线程只写入最新值，随日志一起由主线程刷新
+        self._ui_pending = {}
+
+        # 配置自动保存的防抖定时器
+        self._save_after_id = None
+        self._save_delay = 500  # 毫秒
+
+        # 后台IO线程：逐帧处理时提前解码下一帧，与当前帧的GPU推理重叠
+        self._io_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="apisr-io")
+        self._read_ahead = 4  # 最多提前解码的帧数（单线程顺序执行，帧顺序不变）
+
+        # ffmpeg/ffprobe路径只查找一次；找不到时仍使用命令名，由调用处报错
+        self._ffmpeg = shutil.which('ffmpeg')
+        self._ffprobe = shutil.which('ffprobe')
+        if self._ffmpeg is None:
+            self.log("警告：未在PATH中找到ffmpeg，视频分割和合成将无法进行")
+        self._ffmpeg = self._ffmpeg or 'ffmpeg'
+        self._ffprobe = self._ffprobe or 'ffprobe'
+        self._h264_encoder = None  # 首次编码时检测可用的H.264编码器
+
+        # 后台PNG写入线程池：帧编码写盘与下一帧的GPU推理重叠
+        self._writer_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="apisr-writer")
+        self._write_futures = collections.deque()
+        self._max_pending_writes = 32  # 未完成的写入超过此数时等待最早的一个，限制内存占用
+
         # 初始化变量
         self.input_paths = []  # 改为存储多个视频路径的列表
         self.output_dir = tk.StringVar()
@@ -79,7 +269,8 @@ class APISRVideoProcessor:
         self.scale_var = tk.StringVar(value="4")
         self.segment_duration = tk.StringVar(value="20")
         self.downsample_threshold = tk.StringVar(value="720")
-        self.float16_var = tk.BooleanVar(value=False)
+        self.dtype_var = tk.StringVar(value="FP32")  # 推理数据类型：FP32/FP16/BF16
+        self.compile_var = tk.BooleanVar(value=False)  # torch.compile编译加速
         self.crop_for_4x_var = tk.BooleanVar(value=True)
         self.hash_threshold_var = tk.StringVar(value="3")
         self.ssim_threshold_var = tk.StringVar(value="0.98")
@@ -90,10 +281,15 @@ class APISRVideoProcessor:
         self.enable_history_var = tk.BooleanVar(value=True)
         self.history_size_var = tk.StringVar(value="20")  # 默认值改为20
         self.immediate_merge_var = tk.BooleanVar(value=False)  # 新增：立即合成视频选项
+        self.verbose_dup_log_var = tk.BooleanVar(value=False)  # 逐帧输出重复帧检测日志
+        self.dump_before_frames_var = tk.BooleanVar(value=False)  # 调试用：把原始帧保存到before目录
         self.video_encoder_mode = tk.StringVar(value="auto")  # 新增：视频编码器模式
         self.last_test_mode_state = False  # 记录上一次的测试模式状态
         self.post_action_var = tk.StringVar(value="none")  # 新增：任务结束行为
 
+        # 处理线程使用的参数快照（见_snapshot_settings）
+        self._snapshot_settings()
+
         # 设置样式
         self.setup_styles()
 
@@ -114,6 +310,15 @@ class APISRVideoProcessor:
         self.stopped = False
         self.generator = None
         self.weight_dtype = torch.float32
+        self.channels_last = False  # 生成器是否使用channels_last布局
+        self._eager_generator = None  # torch.compile前的原始模型，编译失败时退回
+
+        # 复用的CPU<->GPU传输缓冲区（每个视频分配一次）
+        self._h2d_buf = None
+        self._d2h_buf = None
+        self._copy_stream = None
+        self._dev_bufs = {}  # 复用的GPU张量（上传帧、模型输入、输出），按名称缓存
+        self._resize_plan = None  # 按输入分辨率缓存的缩放/裁剪尺寸
 
         # 进度恢复相关
         self.current_video_index = 0  # 新增：当前处理视频索引
@@ -125,6 +330,10 @@ class APISRVideoProcessor:
 
         # 重复帧检测相关
         self.dup_frame_count = 0
+        self._reset_segment_dup_counters()
+        self.segment_stats = []  # 当前视频各片段的SegmentStats
+        self.tiny_mse_reject = 400.0  # 32×32缩略图MSE超过该值时不再计算SSIM，直接判为不重复
+        self._phasher = self._create_phasher()  # opencv-contrib的pHash，不可用时为None
 
         # 新增：历史帧缓存系统
         self.init_history_cache()
@@ -140,6 +349,8 @@ class APISRVideoProcessor:
         self.pause_event = threading.Event()
         self.stop_event = threading.Event()
         self.processing_lock = threading.Lock()
+        self._worker_done = threading.Event()  # 处理线程退出时置位
+        self._worker_done.set()
 
         # 新增：暂停时的内存优化
         self.pause_lock = threading.Lock()
@@ -150,11 +361,20 @@ class APISRVideoProcessor:
         self.monitor_thread = None
         self.memory_check_interval = 30  # 30秒检查一次内存
 
+        # GPU信息在后台线程查询一次并缓存，CUDA初始化不阻塞窗口显示
+        self._gpu_info_str, self._gpu_capability = "正在检测GPU...", None
+        self._gpu_probe_result = None
+        threading.Thread(target=self._probe_gpu_background, daemon=True).start()
+
         # 设置历史帧数量验证
         self.setup_history_size_validation()
 
         self.setup_ui()
 
+        # 启动日志刷新调度
+        self._schedule_flush()
+        self.root.after(100, self._poll_gpu_info)
+
         # 设置初始模型
         self.on_model_change()
 
@@ -213,11 +433,7 @@ class APISRVideoProcessor:
             return
 
         # 查找所有测试模式的临时目录
-        test_temp_dirs = []
-        for item in os.listdir(output_dir):
-            item_path = os.path.join(output_dir, item)
-            if os.path.isdir(item_path) and item.endswith("_test_temp"):
-                test_temp_dirs.append(item_path)
+        test_temp_dirs = self.list_subdirs(output_dir, "_test_temp")
 
         if test_temp_dirs:
             self.log(f"找到 {len(test_temp_dirs)} 个测试模式临时目录")
@@ -231,16 +447,10 @@ class APISRVideoProcessor:
     def setup_history_size_validation(self):
         """设置历史帧数量输入的验证 - 修改：移除原来的trace验证，改为焦点离开时调整"""
 
-        # 创建验证函数，确保只能输入整数
+        # 创建验证函数，确保只能输入整数（预编译正则，不走异常路径）
         def validate_integer_input(action, value_if_allowed):
             if action == '1':  # 插入操作
-                if value_if_allowed == '':
-                    return True
-                try:
-                    int(value_if_allowed)
-                    return True
-                except ValueError:
-                    return False
+                return _HISTORY_SIZE_RE.match(value_if_allowed) is not None
             return True
 
         vcmd = (self.root.register(validate_integer_input), '%d', '%P')
@@ -248,8 +458,8 @@ class APISRVideoProcessor:
         # 在setup_ui中创建输入框时使用这个验证函数
         self.history_validation_command = vcmd
 
-    def adjust_history_size(self):
-        """调整历史帧数量为最接近的10的倍数"""
+    def adjust_history_size(self, event=None):
+        """调整历史帧数量为最接近的10的倍数（输入框失去焦点时一次性调整）"""
         try:
             current_value = self.history_size_var.get()
 
@@ -300,15 +510,48 @@ class APISRVideoProcessor:
         style.configure('TLabelframe.Label', background=self.bg_color,
                         font=('Segoe UI', 10, 'bold'))
 
+        # 常用标签样式，控件通过style引用，不再逐个传font参数
+        style.configure('Title.TLabel', font=('Segoe UI', 18, 'bold'), foreground=self.sidebar_color)
+        style.configure('Bold.TLabel', font=('Segoe UI', 10, 'bold'), foreground=self.sidebar_color)
+        style.configure('Muted.TLabel', font=('Segoe UI', 9), foreground='#7f8c8d')
+        style.configure('Small.TLabel', font=('Segoe UI', 8), foreground='#7f8c8d')
+        style.configure('Warning.TLabel', font=('Segoe UI', 8), foreground=self.warning_color)
+
+        # 输入框和下拉框使用TkTextFont，统一设置一次
+        tkfont.nametofont('TkTextFont').configure(family='Segoe UI', size=9)
+
+    def _snapshot_settings(self):
+        """把处理相关的Tk变量读成普通Python属性，逐帧循环中不再跨Tcl读取"""
+        self.dup_enabled = self.enable_dup_detect_var.get()
+        self.test_mode = self.test_mode_var.get()
+        self.use_ssim = self.use_ssim_var.get()
+        self.use_hash = self.use_hash_var.get()
+        self.hash_threshold = int(self.hash_threshold_var.get() or 3)
+        self.ssim_threshold = float(self.ssim_threshold_var.get() or 0.98)
+        self.sr_scale = int(self.scale_var.get())
+        self.downsample_px = int(self.downsample_threshold.get())
+        self.crop_for_4x = self.crop_for_4x_var.get()
+        self.immediate_merge = self.immediate_merge_var.get()
+        self.verbose_dup_log = self.verbose_dup_log_var.get()
+        self.dump_before_frames = self.dump_before_frames_var.get()
+        self.enable_history = self.enable_history_var.get()
+        self.history_size = int(self.history_size_var.get() or 20)
+
+    def _reset_segment_dup_counters(self):
+        """重置当前片段的重复帧检测统计（片段结束时汇总输出一行）"""
+        self._segment_dup_checked = 0
+        self._segment_dup_hash_matches = 0
+        self._segment_dup_hash_diff_sum = 0
+
     def init_history_cache(self):
         """初始化历史帧缓存 - 修复版本"""
         # 检查历史帧开关
-        if not self.enable_history_var.get():
+        if not self.enable_history:
             # 如果历史帧功能关闭，使用默认值1（只与前一帧比较）
             history_size = 1
         else:
             try:
-                history_size = int(self.history_size_var.get())
+                history_size = self.history_size
                 # 确保历史帧数量在有效范围内
                 if history_size < 1:
                     history_size = 10
@@ -320,30 +563,18 @@ class APISRVideoProcessor:
                 history_size = 20  # 默认值
                 self.history_size_var.set("20")
 
-        # 确保deque有最大长度限制
-        self.frame_history = collections.deque(maxlen=history_size)
-        self.frame_hash_history = collections.deque(maxlen=history_size)
-
-        if self.use_ssim_var.get():
-            self.frame_thumbnail_history = collections.deque(maxlen=history_size)
+        # 预分配的环形缓存（哈希、缩略图、超分结果、帧号），参数不变时复用已分配的数组
+        history = getattr(self, 'history', None)
+        if history is not None and history.maxlen == history_size \
+                and history.hash_index.threshold == self.hash_threshold:
+            history.clear()
         else:
-            self.frame_thumbnail_history = None
-
-        self.frame_sr_history = collections.deque(maxlen=history_size)
-        self.frame_idx_history = collections.deque(maxlen=history_size)
-
-    def clear_history_cache(self):
-        """清空历史缓存"""
-        if hasattr(self, 'frame_history'):
-            self.frame_history.clear()
-        if hasattr(self, 'frame_hash_history'):
-            self.frame_hash_history.clear()
-        if hasattr(self, 'frame_thumbnail_history') and self.frame_thumbnail_history:
-            self.frame_thumbnail_history.clear()
-        if hasattr(self, 'frame_sr_history'):
-            self.frame_sr_history.clear()
-        if hasattr(self, 'frame_idx_history'):
-            self.frame_idx_history.clear()
+            self.history = RingCache(history_size, self.hash_threshold)
+
+    def clear_history_cache(self, release=False):
+        """清空历史缓存；release为True时同时释放缓存数组的内存"""
+        if hasattr(self, 'history'):
+            self.history.clear(release)
 
     def setup_ui(self):
         """设置UI布局"""
@@ -355,16 +586,10 @@ class APISRVideoProcessor:
         title_frame = ttk.Frame(main_container)
         title_frame.pack(fill=tk.X, pady=(0, 10))
 
-        title_label = tk.Label(title_frame, text="APISR 视频超分辨率处理工具",
-                               font=('Segoe UI', 18, 'bold'),
-                               foreground=self.sidebar_color,
-                               background=self.bg_color)
+        title_label = ttk.Label(title_frame, text="APISR 视频超分辨率处理工具", style='Title.TLabel')
         title_label.pack(side=tk.LEFT)
 
-        version_label = tk.Label(title_frame, text="v2.0",  # 版本更新到2.0
-                                 font=('Segoe UI', 9),
-                                 foreground='#7f8c8d',
-                                 background=self.bg_color)
+        version_label = ttk.Label(title_frame, text="v2.0", style='Muted.TLabel')  # 版本更新到2.0
         version_label.pack(side=tk.RIGHT)
 
         # 主内容区域 - 使用PanedWindow实现可调整大小的分割
@@ -391,14 +616,10 @@ class APISRVideoProcessor:
         progress_info_frame = ttk.Frame(progress_frame)
         progress_info_frame.pack(fill=tk.X, pady=(0, 3))
 
-        self.progress_info = ttk.Label(progress_info_frame, text="准备开始处理",
-                                       font=('Segoe UI', 10, 'bold'),
-                                       foreground=self.sidebar_color)
+        self.progress_info = ttk.Label(progress_info_frame, text="准备开始处理", style='Bold.TLabel')
         self.progress_info.pack(side=tk.LEFT, anchor=tk.W)
 
-        self.detailed_progress_info = ttk.Label(progress_info_frame, text="",
-                                                font=('Segoe UI', 9),
-                                                foreground='#7f8c8d')
+        self.detailed_progress_info = ttk.Label(progress_info_frame, text="", style='Muted.TLabel')
         self.detailed_progress_info.pack(side=tk.RIGHT, anchor=tk.E)
 
         # 进度条
@@ -480,26 +701,40 @@ class APISRVideoProcessor:
             (self.ssim_threshold_var, 'w'),
             (self.history_size_var, 'w'),
             (self.video_encoder_mode, 'w'),  # 新增：视频编码器模式
+            (self.dtype_var, 'w'),
             (self.post_action_var, 'w'),  # 新增：任务结束行为
         ]
 
         for var, mode in variables_to_trace:
-            var.trace(mode, lambda *args: self.save_config())
+            var.trace(mode, lambda *args: self._schedule_save())
 
         # 为BooleanVar添加回调
         boolean_vars = [
-            self.float16_var,
+            self.compile_var,
             self.crop_for_4x_var,
             self.enable_dup_detect_var,
             self.use_ssim_var,
             self.use_hash_var,
             self.immediate_merge_var,
+            self.verbose_dup_log_var,
+            self.dump_before_frames_var,
             self.test_mode_var,
             self.enable_history_var,
         ]
 
         for var in boolean_vars:
-            var.trace('w', lambda *args: self.save_config())
+            var.trace('w', lambda *args: self._schedule_save())
+
+    def _schedule_save(self):
+        """延迟保存配置：连续修改时只在最后一次修改500毫秒后写一次文件"""
+        if self._save_after_id is not None:
+            self.root.after_cancel(self._save_after_id)
+        self._save_after_id = self.root.after(self._save_delay, self._do_save)
+
+    def _do_save(self):
+        """执行延迟的配置保存"""
+        self._save_after_id = None
+        self.save_config()
 
     def setup_left_panel(self, parent):
         """设置左侧参数面板"""
@@ -521,7 +756,7 @@ class APISRVideoProcessor:
         file_frame.grid_columnconfigure(1, weight=1)
 
         # 输入文件 - 紧凑布局
-        ttk.Label(file_frame, text="输入视频:", font=('Segoe UI', 9)).grid(row=0, column=0, sticky=tk.W, pady=(0, 2))
+        ttk.Label(file_frame, text="输入视频:").grid(row=0, column=0, sticky=tk.W, pady=(0, 2))
 
         input_btn_frame = ttk.Frame(file_frame)
         input_btn_frame.grid(row=0, column=1, sticky=tk.W, pady=(0, 2))
@@ -537,13 +772,13 @@ class APISRVideoProcessor:
         self.input_info_label.pack(side=tk.LEFT, padx=(10, 0))
 
         # 输出目录 - 紧凑布局
-        ttk.Label(file_frame, text="输出目录:", font=('Segoe UI', 9)).grid(row=1, column=0, sticky=tk.W, pady=(2, 0))
+        ttk.Label(file_frame, text="输出目录:").grid(row=1, column=0, sticky=tk.W, pady=(2, 0))
 
         output_entry_frame = ttk.Frame(file_frame)
         output_entry_frame.grid(row=1, column=1, sticky=tk.EW, pady=(2, 0))
         output_entry_frame.grid_columnconfigure(0, weight=1)
 
-        output_entry = ttk.Entry(output_entry_frame, textvariable=self.output_dir, font=('Segoe UI', 9))
+        output_entry = ttk.Entry(output_entry_frame, textvariable=self.output_dir)
         output_entry.grid(row=0, column=0, sticky=tk.EW, padx=(0, 5))
         ttk.Button(output_entry_frame, text="浏览", command=self.select_output_dir, width=8).grid(row=0, column=1)
 
@@ -557,38 +792,42 @@ class APISRVideoProcessor:
         ttk.Label(model_frame, text="选择模型:").grid(row=0, column=0, sticky=tk.W, pady=2, padx=(0, 5))
         model_combo = ttk.Combobox(model_frame, textvariable=self.model_var,
                                    values=list(self.models.keys()),
-                                   state="readonly", width=12, font=('Segoe UI', 9))
+                                   state="readonly", width=12)
         model_combo.grid(row=0, column=1, sticky=tk.W, pady=2)
         model_combo.bind('<<ComboboxSelected>>', self.on_model_change)
 
         ttk.Label(model_frame, text="缩放因子:").grid(row=1, column=0, sticky=tk.W, pady=2, padx=(0, 5))
         self.scale_combo = ttk.Combobox(model_frame, textvariable=self.scale_var,
-                                        state="readonly", width=12, font=('Segoe UI', 9))
+                                        state="readonly", width=12)
         self.scale_combo.grid(row=1, column=1, sticky=tk.W, pady=2)
 
         ttk.Label(model_frame, text="分段时长(秒):").grid(row=2, column=0, sticky=tk.W, pady=2, padx=(0, 5))
         ttk.Entry(model_frame, textvariable=self.segment_duration,
-                  width=12, font=('Segoe UI', 9)).grid(row=2, column=1, sticky=tk.W, pady=2)
+                  width=12).grid(row=2, column=1, sticky=tk.W, pady=2)
 
         ttk.Label(model_frame, text="下采样阈值:").grid(row=3, column=0, sticky=tk.W, pady=2, padx=(0, 5))
         ttk.Entry(model_frame, textvariable=self.downsample_threshold,
-                  width=12, font=('Segoe UI', 9)).grid(row=3, column=1, sticky=tk.W, pady=2)
+                  width=12).grid(row=3, column=1, sticky=tk.W, pady=2)
 
         # 3. 性能设置部分 - 修改：简化了内容
         perf_frame = ttk.LabelFrame(main_frame, text="性能设置", padding=8)
         perf_frame.grid(row=row, column=1, sticky="nsew", padx=2, pady=2)
 
         ttk.Label(perf_frame, text="数据类型:").grid(row=0, column=0, sticky=tk.W, pady=2, padx=(0, 5))
-        ttk.Checkbutton(perf_frame, text="FP16加速",
-                        variable=self.float16_var).grid(row=0, column=1, sticky=tk.W, pady=2)
+        dtype_combo = ttk.Combobox(perf_frame, textvariable=self.dtype_var,
+                                   values=["FP32", "FP16", "BF16"], width=10, state="readonly")
+        dtype_combo.grid(row=0, column=1, sticky=tk.W, pady=2)
 
         ttk.Label(perf_frame, text="视频编码:").grid(row=1, column=0, sticky=tk.W, pady=2, padx=(0, 5))
         encoder_combo = ttk.Combobox(perf_frame, textvariable=self.video_encoder_mode,
                                      values=["auto", "opencv", "ffmpeg"], width=10, state="readonly")
         encoder_combo.grid(row=1, column=1, sticky=tk.W, pady=2)
 
-        # 添加两行空行以保持布局平衡
-        ttk.Label(perf_frame, text="").grid(row=2, column=0, pady=2)
+        ttk.Label(perf_frame, text="模型编译:").grid(row=2, column=0, sticky=tk.W, pady=2, padx=(0, 5))
+        ttk.Checkbutton(perf_frame, text="torch.compile",
+                        variable=self.compile_var).grid(row=2, column=1, sticky=tk.W, pady=2)
+
+        # 添加一行空行以保持布局平衡
         ttk.Label(perf_frame, text="").grid(row=3, column=0, pady=2)
 
         row += 1
@@ -614,16 +853,16 @@ class APISRVideoProcessor:
         hash_frame = ttk.Frame(dup_frame)
         hash_frame.grid(row=2, column=1, sticky=tk.W, pady=2)
         ttk.Entry(hash_frame, textvariable=self.hash_threshold_var,
-                  width=8, font=('Segoe UI', 9)).pack(side=tk.LEFT, padx=(0, 5))
-        ttk.Label(hash_frame, text="(0-10)", foreground='#7f8c8d', font=('Segoe UI', 8)).pack(side=tk.LEFT)
+                  width=8).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Label(hash_frame, text="(0-10)", style='Small.TLabel').pack(side=tk.LEFT)
 
         # SSIM阈值
         ttk.Label(dup_frame, text="SSIM阈值:").grid(row=3, column=0, sticky=tk.W, pady=2)
         ssim_frame = ttk.Frame(dup_frame)
         ssim_frame.grid(row=3, column=1, sticky=tk.W, pady=2)
         ttk.Entry(ssim_frame, textvariable=self.ssim_threshold_var,
-                  width=8, font=('Segoe UI', 9)).pack(side=tk.LEFT, padx=(0, 5))
-        ttk.Label(ssim_frame, text="(0.9-1.0)", foreground='#7f8c8d', font=('Segoe UI', 8)).pack(side=tk.LEFT)
+                  width=8).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Label(ssim_frame, text="(0.9-1.0)", style='Small.TLabel').pack(side=tk.LEFT)
 
         # 历史帧设置
         ttk.Label(dup_frame, text="历史帧设置:").grid(row=4, column=0, sticky=tk.W, pady=2)
@@ -644,7 +883,7 @@ class APISRVideoProcessor:
 
         # 创建历史帧数量输入框 - 修改：使用验证命令并绑定焦点离开事件
         self.history_entry = ttk.Entry(history_size_frame, textvariable=self.history_size_var,
-                                       width=6, font=('Segoe UI', 9),
+                                       width=6,
                                        validate='key', validatecommand=self.history_validation_command,
                                        state='normal' if self.enable_history_var.get() else 'disabled')
         self.history_entry.pack(side=tk.LEFT, padx=(0, 5))
@@ -652,17 +891,14 @@ class APISRVideoProcessor:
         # 绑定焦点离开事件
         self.history_entry.bind('<FocusOut>', self.adjust_history_size)
 
-        ttk.Label(history_size_frame, text="(1-200)", foreground='#7f8c8d', font=('Segoe UI', 8)).pack(side=tk.LEFT)
+        ttk.Label(history_size_frame, text="(1-200)", style='Small.TLabel').pack(side=tk.LEFT)
 
         # 4.1 任务结束行为部分 - 占用一行第二列
         action_frame = ttk.LabelFrame(main_frame, text="任务结束行为", padding=8)
         action_frame.grid(row=row, column=1, columnspan=1, sticky="nsew", padx=2, pady=2)
 
         # 添加说明标签
-        info_label = tk.Label(action_frame, text="批量处理结束后自动执行:",
-                              font=('Segoe UI', 9),
-                              foreground='#7f8c8d',
-                              background=self.bg_color)
+        info_label = ttk.Label(action_frame, text="批量处理结束后自动执行:", style='Muted.TLabel')
         info_label.pack(anchor=tk.W, pady=(0, 5))
 
         # 创建单选按钮
@@ -679,10 +915,7 @@ class APISRVideoProcessor:
                         value="shutdown").pack(anchor=tk.W, pady=2)
 
         # 添加警告标签
-        warning_label = tk.Label(action_frame, text="注意：选中关机将自动执行，无需确认",
-                                 font=('Segoe UI', 8),
-                                 foreground=self.warning_color,
-                                 background=self.bg_color)
+        warning_label = ttk.Label(action_frame, text="注意：选中关机将自动执行，无需确认", style='Warning.TLabel')
         warning_label.pack(anchor=tk.W, pady=(5, 0))
 
         row += 1
@@ -704,6 +937,12 @@ class APISRVideoProcessor:
         ttk.Checkbutton(options_frame, text="立即合成视频",
                         variable=self.immediate_merge_var).pack(anchor=tk.W, pady=2)
 
+        ttk.Checkbutton(options_frame, text="详细重复帧日志(逐帧)",
+                        variable=self.verbose_dup_log_var).pack(anchor=tk.W, pady=2)
+
+        ttk.Checkbutton(options_frame, text="保存原始帧(调试)",
+                        variable=self.dump_before_frames_var).pack(anchor=tk.W, pady=2)
+
         # 说明信息部分
         info_frame = ttk.LabelFrame(bottom_frame, text="说明", padding=8)
         info_frame.grid(row=0, column=1, sticky="nsew", padx=(5, 0), pady=0)
@@ -717,11 +956,7 @@ class APISRVideoProcessor:
 7. 所有视频片段处理完后都会立即合成视频
 8. 开启立即合成功能会在每个片段完成后合并到整体视频"""
 
-        info_label = tk.Label(info_frame, text=info_text,
-                              font=('Segoe UI', 8),
-                              foreground='#7f8c8d',
-                              background=self.bg_color,
-                              justify=tk.LEFT)
+        info_label = ttk.Label(info_frame, text=info_text, style='Small.TLabel', justify=tk.LEFT)
         info_label.pack(anchor=tk.W)
 
     def setup_right_panel(self, parent):
@@ -732,7 +967,8 @@ class APISRVideoProcessor:
         self.log_text = ScrolledText(log_frame, height=28, width=60,
                                      font=('Consolas', 9),
                                      bg='#2c3e50', fg='white',
-                                     insertbackground='white')
+                                     insertbackground='white',
+                                     state='disabled')
         self.log_text.pack(fill=tk.BOTH, expand=True)
 
     def toggle_history_settings(self):
@@ -744,13 +980,30 @@ class APISRVideoProcessor:
             self.history_entry.config(state='disabled')
             self.log("历史帧功能已禁用")
 
-    def get_gpu_info(self):
-        """获取GPU信息"""
+    def _probe_gpu(self):
+        """查询一次GPU信息，返回(显示文本, 计算能力)"""
         if torch.cuda.is_available():
-            gpu_name = torch.cuda.get_device_name(0)
-            gpu_memory = torch.cuda.get_device_properties(0).total_memory / 1024 ** 3
-            return f"GPU: {gpu_name} ({gpu_memory:.1f}GB)"
-        return "无可用GPU"
+            props = torch.cuda.get_device_properties(0)
+            gpu_memory = props.total_memory / 1024 ** 3
+            capability = (props.major, props.minor)
+            return f"GPU: {props.name} ({gpu_memory:.1f}GB, SM {props.major}.{props.minor})", capability
+        return "无可用GPU", None
+
+    def _probe_gpu_background(self):
+        """后台线程：查询GPU信息，结果由Tk主线程取走"""
+        self._gpu_probe_result = self._probe_gpu()
+
+    def _poll_gpu_info(self):
+        """在Tk主线程中等待后台GPU查询完成并刷新状态栏"""
+        if self._gpu_probe_result is None:
+            self.root.after(100, self._poll_gpu_info)
+            return
+        self._gpu_info_str, self._gpu_capability = self._gpu_probe_result
+        self.gpu_label.config(text=self._gpu_info_str)
+
+    def get_gpu_info(self):
+        """获取GPU信息（启动时已缓存）"""
+        return self._gpu_info_str
 
     def on_model_change(self):
         """当模型改变时更新可用缩放因子"""
@@ -785,9 +1038,9 @@ class APISRVideoProcessor:
                 self.input_info_label.config(text=f"已选择: {file_name}")
             else:
                 self.input_info_label.config(text=f"已选择 {len(self.input_paths)} 个视频")
-                self.log(f"已选择 {len(self.input_paths)} 个视频文件，将按以下顺序处理:")
-                for i, path in enumerate(self.input_paths):
-                    self.log(f"  {i + 1}. {os.path.basename(path)}")
+                names = [os.path.basename(path) for path in self.input_paths]
+                self.log(f"已选择 {len(names)} 个视频文件，将按以下顺序处理:\n" +
+                         "\n".join(f"  {i + 1}. {name}" for i, name in enumerate(names)))
 
             # 自动设置输出目录（以第一个视频的目录为准）
             if not self.output_dir.get():
@@ -824,16 +1077,16 @@ class APISRVideoProcessor:
         video_name = Path(video_path).stem
 
         # 根据测试模式添加后缀
-        if self.test_mode_var.get():
+        if self.test_mode:
             temp_dir_suffix = "_test_temp"
             self.is_test_mode_folder = True
         else:
             temp_dir_suffix = "_temp"
             self.is_test_mode_folder = False
 
-        # 基于视频文件名创建临时目录
+        # 基于视频文件名创建临时目录（一次性转换为绝对路径，后续派生路径均为绝对路径）
         temp_dir_name = f"{video_name}{temp_dir_suffix}"
-        self.temp_base_dir = os.path.join(output_dir, temp_dir_name)
+        self.temp_base_dir = os.path.abspath(os.path.join(output_dir, temp_dir_name))
 
         # 创建标准化的目录结构 - 删除05_logs相关
         dirs = {
@@ -852,7 +1105,10 @@ class APISRVideoProcessor:
         return dirs
 
     def setup_segment_frame_dirs(self, segment_path):
-        """为当前片段设置帧目录 - 根据01_original_segments里的文件名来命名"""
+        """为当前片段设置帧目录 - 根据01_original_segments里的文件名来命名
+
+        before目录只在勾选“保存原始帧(调试)”时创建，否则返回None
+        """
         if not self.temp_base_dir:
             return None, None
 
@@ -863,7 +1119,10 @@ class APISRVideoProcessor:
         before_dir = os.path.join(self.temp_base_dir, "03_segment_frames", f"{segment_name}_before")
         after_dir = os.path.join(self.temp_base_dir, "03_segment_frames", f"{segment_name}_after")
 
-        os.makedirs(before_dir, exist_ok=True)
+        if self.dump_before_frames:
+            os.makedirs(before_dir, exist_ok=True)
+        else:
+            before_dir = None
         os.makedirs(after_dir, exist_ok=True)
 
         return before_dir, after_dir
@@ -887,16 +1146,18 @@ class APISRVideoProcessor:
                 except Exception as e:
                     pass
 
+    def list_subdirs(self, parent, *suffixes):
+        """列出parent下名称以suffixes之一结尾的子目录（scandir直接从目录项取类型，不再逐个stat）"""
+        with os.scandir(parent) as it:
+            return [entry.path for entry in it
+                    if entry.name.endswith(suffixes) and entry.is_dir(follow_symlinks=False)]
+
     def cleanup_temp_files(self):
         """清理临时文件"""
         output_dir = self.output_dir.get()
         if output_dir:
             # 查找所有基于视频文件名的临时目录
-            temp_dirs = []
-            for item in os.listdir(output_dir):
-                item_path = os.path.join(output_dir, item)
-                if os.path.isdir(item_path) and (item.endswith("_temp") or item.endswith("_test_temp")):
-                    temp_dirs.append(item_path)
+            temp_dirs = self.list_subdirs(output_dir, "_temp", "_test_temp")
 
             if temp_dirs:
                 response = messagebox.askyesno("清理临时文件",
@@ -914,57 +1175,108 @@ class APISRVideoProcessor:
                 messagebox.showinfo("清理临时文件", "没有找到临时文件")
 
     def log(self, message):
-        """添加日志"""
-        if not hasattr(self, 'log_text'):
-            # 如果log_text还不存在，先打印到控制台
-            print(f"[初始化] {message}")
+        """添加日志（仅入队，不直接操作Tk控件）"""
+        ts = time.time()
+        self._log_q.append((ts, message))
+        if self.headless:
+            print(f"[{datetime.fromtimestamp(ts).strftime('%H:%M:%S')}] {message}", flush=True)
+
+    def show_message(self, kind, title, message):
+        """弹出提示框；无界面模式下只写日志"""
+        if self.headless:
+            if kind != "info":
+                self.last_error = message
+            self.log(f"{title}: {message}")
             return
+        getattr(messagebox, f"show{kind}")(title, message)
+
+    def _schedule_flush(self):
+        """调度下一次日志刷新"""
+        self.root.after(self._log_flush_interval, self._flush_log)
+
+    def _apply_ui_pending(self):
+        """把待更新的控件值写入控件，同一控件在一个周期内只更新最后一次"""
+        pending = self._ui_pending
+        for key in ('status', 'progress_info', 'detail', 'dup', 'progress'):
+            value = pending.pop(key, None)
+            if value is None:
+                continue
+            if key == 'status':
+                self.status_label.config(text=value[0], foreground=value[1])
+            elif key == 'progress_info':
+                self.progress_info.config(text=value)
+            elif key == 'detail':
+                current_frame, total_frames = value
+                percentage = current_frame / total_frames * 100
+                self.detailed_progress_info.config(
+                    text=f"当前片段: 第 {current_frame}/{total_frames} 帧 ({percentage:.1f}%)")
+            elif key == 'dup':
+                self.dup_info.config(text=value)
+            else:
+                self.progress_var.set(value)
 
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
+    def _flush_log(self):
+        """在Tk主线程中批量写入日志并刷新状态控件"""
+        try:
+            self._apply_ui_pending()
+
+            # 一次取出队列中的全部日志，超出控件保留行数的部分直接丢弃
+            entries = []
+            while self._log_q:
+                entries.append(self._log_q.popleft())
+            del entries[:-self._log_max_lines]
+
+            lines = [f"[{datetime.fromtimestamp(ts).strftime('%H:%M:%S')}] {message}" for ts, message in entries]
+
+            if lines:
+                self.log_text.config(state='normal')
+                self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+
+                # 控件只保留最近的日志行，避免长时间运行后内存和重排开销不断增长
+                line_count = int(self.log_text.index('end-1c').split('.')[0])
+                if line_count > self._log_max_lines:
+                    self.log_text.delete('1.0', f'{line_count - self._log_max_lines + 1}.0')
+
+                self.log_text.config(state='disabled')
+                self.log_text.see(tk.END)
+        except tk.TclError:
+            # 窗口已销毁
+            return
+
+        self._schedule_flush()
 
     def clear_log(self):
         """清空日志"""
+        self.log_text.config(state='normal')
         self.log_text.delete(1.0, tk.END)
+        self.log_text.config(state='disabled')
 
     def update_status(self, message, color="black"):
         """更新状态"""
-        colors = {
-            "black": "#2c3e50",
-            "green": self.success_color,
-            "blue": self.accent_color,
-            "orange": self.warning_color,
-            "red": self.danger_color
-        }
-        self.status_label.config(text=message, foreground=colors.get(color, color))
-        self.root.update_idletasks()
+        self._ui_pending['status'] = (message, self._status_colors.get(color, color))
+
+    def set_progress_info(self, text):
+        """设置进度标题文字（由主线程刷新）"""
+        self._ui_pending['progress_info'] = text
 
     def update_progress_info(self):
         """更新进度信息"""
         if self.total_segments > 0:
             info = f"视频 {self.current_video_index + 1}/{len(self.input_paths)} - 片段 {self.current_segment_index + 1}/{self.total_segments}"
-            self.progress_info.config(text=info)
-            self.root.update_idletasks()
+            self.set_progress_info(info)
 
     def update_detailed_progress(self, current_frame, total_frames):
-        """更新详细进度信息"""
+        """更新详细进度信息（只记录最新值，由主线程每100毫秒格式化并刷新一次）"""
         if total_frames > 0:
-            percentage = current_frame / total_frames * 100
-            info = f"当前片段: 第 {current_frame}/{total_frames} 帧 ({percentage:.1f}%)"
-            self.detailed_progress_info.config(text=info)
-            self.root.update_idletasks()
+            self._ui_pending['detail'] = (current_frame, total_frames)
 
     def update_dup_info(self, dup_count):
         """更新重复帧信息"""
-        self.dup_info.config(text=f"重复帧: {dup_count}")
-        self.root.update_idletasks()
+        self._ui_pending['dup'] = f"重复帧: {dup_count}"
 
     def update_progress(self, value):
         """更新进度条"""
-        self.progress_var.set(value)
-        self.root.update_idletasks()
+        self._ui_pending['progress'] = value
 
     def load_config(self):
         """加载配置文件"""
@@ -997,8 +1309,13 @@ class APISRVideoProcessor:
                     self.segment_duration.set(str(safe_get_int('segment_duration', 20, config)))
                 if 'downsample_threshold' in config:
                     self.downsample_threshold.set(str(safe_get_int('downsample_threshold', 720, config)))
-                if 'float16' in config:
-                    self.float16_var.set(config['float16'])
+                if config.get('dtype') in ("FP32", "FP16", "BF16"):
+                    self.dtype_var.set(config['dtype'])
+                elif 'float16' in config:
+                    # 兼容旧配置的FP16开关
+                    self.dtype_var.set("FP16" if config['float16'] else "FP32")
+                if 'compile' in config:
+                    self.compile_var.set(config['compile'])
                 if 'crop_for_4x' in config:
                     self.crop_for_4x_var.set(config['crop_for_4x'])
                 if 'hash_threshold' in config:
@@ -1020,6 +1337,10 @@ class APISRVideoProcessor:
                     self.history_size_var.set(str(safe_get_int('history_size', 20, config)))
                 if 'immediate_merge' in config:
                     self.immediate_merge_var.set(config['immediate_merge'])
+                if 'verbose_dup_log' in config:
+                    self.verbose_dup_log_var.set(config['verbose_dup_log'])
+                if 'dump_before_frames' in config:
+                    self.dump_before_frames_var.set(config['dump_before_frames'])
                 if 'video_encoder_mode' in config:
                     self.video_encoder_mode.set(config['video_encoder_mode'])
                 if 'post_action' in config:
@@ -1038,8 +1359,8 @@ class APISRVideoProcessor:
         else:
             self.log("未找到配置文件，使用默认配置")
 
-    def save_config(self):
-        """保存配置文件（永远自动保存）"""
+    def save_config(self, durable=False):
+        """保存配置文件（永远自动保存）；durable为True时落盘后再返回（退出时使用）"""
         try:
             # 使用默认值处理空字符串或无效输入
             def get_int_value(var, default):
@@ -1062,7 +1383,8 @@ class APISRVideoProcessor:
                 'scale': get_int_value(self.scale_var, 4),
                 'segment_duration': get_int_value(self.segment_duration, 20),
                 'downsample_threshold': get_int_value(self.downsample_threshold, 720),
-                'float16': self.float16_var.get(),
+                'dtype': self.dtype_var.get(),
+                'compile': self.compile_var.get(),
                 'crop_for_4x': self.crop_for_4x_var.get(),
                 'hash_threshold': get_int_value(self.hash_threshold_var, 3),
                 'ssim_threshold': get_float_value(self.ssim_threshold_var, 0.98),
@@ -1073,13 +1395,21 @@ class APISRVideoProcessor:
                 'enable_history': self.enable_history_var.get(),
                 'history_size': get_int_value(self.history_size_var, 20),
                 'immediate_merge': self.immediate_merge_var.get(),
+                'verbose_dup_log': self.verbose_dup_log_var.get(),
+                'dump_before_frames': self.dump_before_frames_var.get(),
                 'video_encoder_mode': self.video_encoder_mode.get(),
                 'post_action': self.post_action_var.get(),
                 'last_saved': datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # 修正了日期格式错误
             }
 
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=4, ensure_ascii=False)
+            # 先写临时文件再替换，避免写到一半时留下损坏的配置文件
+            tmp_file = self.config_file + ".tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(config, separators=(',', ':'), ensure_ascii=False))
+                if durable:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_file, self.config_file)
 
         except Exception as e:
             self.log(f"保存配置文件时出错: {e}")
@@ -1174,12 +1504,32 @@ class APISRVideoProcessor:
         else:
             self.log(f"未知的任务结束行为: {action}")
 
+    def _load_checkpoint(self, path):
+        """加载权重文件到CPU（由load_model统一搬到GPU）；优先使用weights_only安全加载"""
+        try:
+            return torch.load(path, map_location='cpu', weights_only=True)
+        except TypeError:
+            # 旧版PyTorch没有weights_only参数
+            return torch.load(path, map_location='cpu')
+        except pickle.UnpicklingError as e:
+            # 检查点中含有张量以外的对象（如训练配置），退回完整加载
+            self.log(f"权重文件无法以weights_only方式加载，改用完整加载: {e}")
+            return torch.load(path, map_location='cpu', weights_only=False)
+
+    def _materialize(self, generator, weight):
+        """去掉torch.compile保存的_orig_mod.前缀，加载权重并切换到推理模式"""
+        weight = {k[10:] if k.startswith("_orig_mod.") else k: v for k, v in weight.items()}
+        generator.load_state_dict(weight)
+        return generator.eval()
+
     def load_rrdb(self, generator_weight_PATH, scale, print_options=False):
         '''加载RRDB模型'''
-        start_time = time.time()
+        from architecture.rrdb import RRDBNet
+
+        start_time = _t()
 
         # 加载检查点
-        checkpoint_g = torch.load(generator_weight_PATH)
+        checkpoint_g = self._load_checkpoint(generator_weight_PATH)
 
         # 查找生成器权重
         if 'params_ema' in checkpoint_g:
@@ -1200,16 +1550,7 @@ class APISRVideoProcessor:
         else:
             raise ValueError("This weight is not supported")
 
-        # 处理torch.compile权重键重命名
-        old_keys = [key for key in weight]
-        for old_key in old_keys:
-            if old_key[:10] == "_orig_mod.":
-                new_key = old_key[10:]
-                weight[new_key] = weight[old_key]
-                del weight[old_key]
-
-        generator.load_state_dict(weight)
-        generator = generator.eval().cuda()
+        generator = self._materialize(generator, weight)
 
         # 打印选项以显示使用了哪些设置
         if print_options:
@@ -1218,20 +1559,22 @@ class APISRVideoProcessor:
                     value = checkpoint_g['opt'][key]
                     print(f'{key} : {value}')
 
-        elapsed = time.time() - start_time
+        elapsed = _t() - start_time
         self.log(f"RRDB模型加载耗时: {elapsed:.2f}秒")
 
         return generator
 
     def load_cunet(self, generator_weight_PATH, scale, print_options=False):
         '''加载CUNET模型'''
-        start_time = time.time()
+        from architecture.cunet import UNet_Full
+
+        start_time = _t()
 
         if scale != 2:
             raise NotImplementedError("We only support 2x in CUNET")
 
         # 加载检查点
-        checkpoint_g = torch.load(generator_weight_PATH)
+        checkpoint_g = self._load_checkpoint(generator_weight_PATH)
 
         # 查找生成器权重
         if 'model_state_dict' in checkpoint_g:
@@ -1249,16 +1592,7 @@ class APISRVideoProcessor:
         else:
             raise ValueError("This weight is not supported")
 
-        # 处理torch.compile权重键重命名
-        old_keys = [key for key in weight]
-        for old_key in old_keys:
-            if old_key[:10] == "_orig_mod.":
-                new_key = old_key[10:]
-                weight[new_key] = weight[old_key]
-                del weight[old_key]
-
-        generator.load_state_dict(weight)
-        generator = generator.eval().cuda()
+        generator = self._materialize(generator, weight)
 
         # 打印选项以显示使用了哪些设置
         if print_options:
@@ -1267,17 +1601,19 @@ class APISRVideoProcessor:
                     value = checkpoint_g['opt'][key]
                     print(f'{key} : {value}')
 
-        elapsed = time.time() - start_time
+        elapsed = _t() - start_time
         self.log(f"CUNET模型加载耗时: {elapsed:.2f}秒")
 
         return generator
 
     def load_grl(self, generator_weight_PATH, scale=4):
         '''加载GRL模型'''
-        start_time = time.time()
+        from architecture.grl import GRL
+
+        start_time = _t()
 
         # 加载检查点
-        checkpoint_g = torch.load(generator_weight_PATH)
+        checkpoint_g = self._load_checkpoint(generator_weight_PATH)
 
         # 查找生成器权重
         if 'model_state_dict' in checkpoint_g:
@@ -1299,21 +1635,17 @@ class APISRVideoProcessor:
                 out_proj_type="linear",
                 conv_type="1conv",
                 upsampler="nearest+conv",  # 更改
-            ).cuda()
+            )
 
         else:
             raise ValueError("This weight is not supported")
 
-        generator.load_state_dict(weight)
-        generator = generator.eval().cuda()
+        generator = self._materialize(generator, weight)
 
         # 计算参数数量
-        num_params = 0
-        for p in generator.parameters():
-            if p.requires_grad:
-                num_params += p.numel()
+        num_params = sum(p.numel() for p in generator.parameters() if p.requires_grad)
 
-        elapsed = time.time() - start_time
+        elapsed = _t() - start_time
         self.log(f"GRL模型加载耗时: {elapsed:.2f}秒")
         self.log(f"GRL模型参数数量: {num_params / 10 ** 6: 0.2f}M")
 
@@ -1321,10 +1653,12 @@ class APISRVideoProcessor:
 
     def load_dat(self, generator_weight_PATH):
         '''加载DAT模型'''
-        start_time = time.time()
+        from architecture.dat import DAT
+
+        start_time = _t()
 
         # 加载检查点
-        checkpoint_g = torch.load(generator_weight_PATH)
+        checkpoint_g = self._load_checkpoint(generator_weight_PATH)
 
         # 查找生成器权重
         if 'model_state_dict' in checkpoint_g:
@@ -1342,120 +1676,116 @@ class APISRVideoProcessor:
                             resi_connection='1conv',
                             split_size=[8, 16],
                             upsampler='pixelshuffledirect',
-                            ).cuda()
+                            )
 
         else:
             raise ValueError("This weight is not supported")
 
-        generator.load_state_dict(weight)
-        generator = generator.eval().cuda()
+        generator = self._materialize(generator, weight)
 
         # 计算参数数量
-        num_params = 0
-        for p in generator.parameters():
-            if p.requires_grad:
-                num_params += p.numel()
+        num_params = sum(p.numel() for p in generator.parameters() if p.requires_grad)
 
-        elapsed = time.time() - start_time
+        elapsed = _t() - start_time
         self.log(f"DAT模型加载耗时: {elapsed:.2f}秒")
         self.log(f"DAT模型参数数量: {num_params / 10 ** 6: 0.2f}M")
 
         return generator
 
+    def _create_phasher(self):
+        """创建opencv-contrib的img_hash.PHash（原生C++实现），未安装contrib时返回None"""
+        try:
+            return cv2.img_hash.PHash_create()
+        except AttributeError:
+            return None
+
     def calculate_frame_hash(self, frame):
-        """计算帧的感知哈希值（优化版）"""
-        start_time = time.time()
+        """计算帧的感知哈希值（pHash，打包为64位整数）；frame可以是BGR图或灰度缩略图"""
+        start_time = _t()
 
-        # 先缩小图像以减少计算量
-        h, w = frame.shape[:2]
-        if h > 360 or w > 480:
-            new_h = 360
-            new_w = int(w * (360 / h))
-            frame_resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        if self._phasher is not None:
+            # img_hash一次完成灰度、缩放、DCT和打包，返回8字节
+            frame_hash = int.from_bytes(self._phasher.compute(frame).tobytes(), 'big')
         else:
-            frame_resized = frame
-
-        frame_rgb = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)
-        pil_img = Image.fromarray(frame_rgb)
-
-        # 使用更高效的哈希方法
-        frame_hash = imagehash.phash(pil_img, hash_size=8)  # 减小哈希大小以提高计算速度
-
-        elapsed = time.time() - start_time
+            # 32×32 -> 灰度 -> DCT，取左上角8×8低频系数与中位数比较
+            # （缩放和灰度转换都是线性运算，先缩小再转灰度，避免整帧灰度转换）
+            small = cv2.resize(frame, (32, 32), interpolation=cv2.INTER_AREA)
+            if small.ndim == 3:
+                small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            small = small.astype(np.float32)
+            low_freq = cv2.dct(small)[:8, :8]
+            bits = (low_freq > np.median(low_freq)).ravel()
+            frame_hash = int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+        elapsed = _t() - start_time
         return frame_hash, elapsed
 
-    def calculate_ssim_fast(self, frame1, frame2):
-        """快速计算SSIM（优化版）"""
-        start_time = time.time()
-
-        # 将图像缩小以加速计算
-        h1, w1 = frame1.shape[:2]
-        h2, w2 = frame2.shape[:2]
-
-        # 使用较小的固定尺寸
-        target_size = (180, 320)  # 16:9的比例
-
-        # 如果图像比目标尺寸大，则缩小
-        if h1 > target_size[0] or w1 > target_size[1]:
-            scale_factor = min(target_size[0] / h1, target_size[1] / w1)
-            new_h = int(h1 * scale_factor)
-            new_w = int(w1 * scale_factor)
-            gray1 = cv2.resize(cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY), (new_w, new_h))
-        else:
-            gray1 = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
-
-        if h2 > target_size[0] or w2 > target_size[1]:
-            scale_factor = min(target_size[0] / h2, target_size[1] / w2)
-            new_h = int(h2 * scale_factor)
-            new_w = int(w2 * scale_factor)
-            gray2 = cv2.resize(cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY), (new_w, new_h))
-        else:
-            gray2 = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY)
-
-        try:
-            ssim_value, _ = ssim(gray1, gray2, full=True, data_range=255)
-            elapsed = time.time() - start_time
-            return ssim_value, elapsed
-        except:
-            return 0.0, time.time() - start_time
+    def make_dup_thumbnail(self, frame):
+        """生成重复帧检测用的缩略图：(SSIM用灰度图, 32×32早筛灰度图)"""
+        # 先缩小到不超过180×320（16:9）再转灰度，避免整帧灰度转换
+        h, w = frame.shape[:2]
+        if h > 180 or w > 320:
+            scale_factor = min(180 / h, 320 / w)
+            frame = cv2.resize(frame, (int(w * scale_factor), int(h * scale_factor)))
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        tiny = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+        return gray, tiny
+
+    def calculate_ssim_batch(self, gray, candidates):
+        """批量计算SSIM（7×7均值窗口、样本协方差，与skimage默认参数一致）"""
+        if min(gray.shape) < 7:
+            return np.zeros(len(candidates), dtype=np.float32)
+
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        win = 7
+        cov_norm = win * win / (win * win - 1)
+        c1 = 0.01 ** 2
+        c2 = 0.03 ** 2
+
+        with torch.inference_mode():
+            y = torch.from_numpy(np.ascontiguousarray(candidates)).to(device).unsqueeze(1).float().div_(255.0)
+            x = torch.from_numpy(gray).to(device).float().div_(255.0)[None, None]
+
+            # 当前帧的均值和方差只算一次，与各候选广播计算
+            ux = F.avg_pool2d(x, win, stride=1)
+            vx = cov_norm * (F.avg_pool2d(x * x, win, stride=1) - ux * ux)
+            uy = F.avg_pool2d(y, win, stride=1)
+            vy = cov_norm * (F.avg_pool2d(y * y, win, stride=1) - uy * uy)
+            vxy = cov_norm * (F.avg_pool2d(x * y, win, stride=1) - ux * uy)
+
+            s_map = ((2 * ux * uy + c1) * (2 * vxy + c2)) / ((ux * ux + uy * uy + c1) * (vx + vy + c2))
+            return s_map.mean(dim=(1, 2, 3)).cpu().numpy()
 
     def check_frame_duplicate_enhanced(self, frame, frame_idx):
         """增强版重复帧检测，检查最近N帧"""
-        if not self.enable_dup_detect_var.get() or not self.frame_history:
+        if not self.dup_enabled or not len(self.history):
             return False, None, None, None
 
-        total_start_time = time.time()
-        history_size = len(self.frame_history)
+        total_start_time = _t()
 
         current_hash = None
         current_thumbnail = None
 
         # 计算当前帧的信息（按需计算）
-        hash_time = 0
-        if self.use_hash_var.get():
-            hash_start = time.time()
-            current_hash, hash_time = self.calculate_frame_hash(frame)
-            hash_time = time.time() - hash_start
-
         ssim_thumbnail_time = 0
-        if self.use_ssim_var.get():
-            # 保存缩略图用于SSIM计算
-            thumb_start = time.time()
-            h, w = frame.shape[:2]
-            if h > 180 or w > 320:
-                new_h = 180
-                new_w = int(w * (180 / h))
-                current_thumbnail = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
-            else:
-                current_thumbnail = frame.copy()
-            ssim_thumbnail_time = time.time() - thumb_start
+        if self.use_ssim:
+            # 生成缩略图用于SSIM计算
+            thumb_start = _t()
+            current_thumbnail = self.make_dup_thumbnail(frame)
+            ssim_thumbnail_time = _t() - thumb_start
+
+        hash_time = 0
+        if self.use_hash:
+            # 有缩略图时直接从缩略图的灰度图计算哈希，不再处理整帧
+            current_hash, hash_time = self.calculate_frame_hash(
+                current_thumbnail[0] if current_thumbnail is not None else frame)
 
-        # 获取阈值
-        hash_threshold = int(self.hash_threshold_var.get())
-        ssim_threshold = float(self.ssim_threshold_var.get())
+        # 获取阈值（哈希阈值已在HashIndex中）
+        ssim_threshold = self.ssim_threshold
 
         # 从最近帧开始检查（时间上越接近越可能重复）
-        best_match_idx = -1
+        best_match_slot = -1
         best_match_reason = ""
         best_hash_diff = None
         best_ssim_value = None
@@ -1463,84 +1793,95 @@ class APISRVideoProcessor:
         detected_ssim_value = None
 
         # 遍历历史帧（从最近的开始）
-        compare_start = time.time()
+        compare_start = _t()
         ssim_compare_time = 0
         hash_compare_time = 0
 
-        for i, (hist_frame, hist_hash, hist_thumbnail, hist_sr_result, hist_frame_idx) in enumerate(
-                zip(self.frame_history, self.frame_hash_history,
-                    self.frame_thumbnail_history if self.use_ssim_var.get() else [None] * len(self.frame_history),
-                    self.frame_sr_history,
-                    self.frame_idx_history)):
+        # 第一步：通过哈希索引找出汉明距离在阈值内的历史哈希
+        history = self.history
+        hash_matches = None
+        if self.use_hash and current_hash is not None:
+            hash_compare_start = _t()
+            hash_matches = history.hash_index.query(current_hash)
+            hash_compare_time = _t() - hash_compare_start
+
+        # 从新到旧筛选候选槽位（哈希索引无命中时无需遍历）
+        candidates = []
+        if hash_matches is None or hash_matches:
+            for slot in history.newest_first():
+                hist_hash = history.hashes[slot]
+
+                # 如果使用哈希检测
+                if hash_matches is not None and hist_hash is not None:
+                    hash_diff = hash_matches.get(hist_hash)
+                    if hash_diff is None:
+                        continue
+
+                    # 记录哈希差值（用于日志输出）
+                    detected_hash_diff = hash_diff
+
+                    if not self.use_ssim:
+                        # 只使用哈希检测
+                        best_match_slot = slot
+                        best_match_reason = f"哈希匹配(差异:{hash_diff})"
+                        best_hash_diff = hash_diff
+                        break
 
-            # 跳过无效记录
-            if hist_frame is None or hist_sr_result is None:
-                continue
+                    # 同时启用了SSIM检测，需要验证SSIM
+                    if history.has_thumb[slot]:
+                        candidates.append((slot, hash_diff))
+                # 如果只使用SSIM检测
+                elif self.use_ssim and current_thumbnail is not None and history.has_thumb[slot]:
+                    candidates.append((slot, None))
 
-            # 如果使用哈希检测
-            if self.use_hash_var.get() and current_hash is not None and hist_hash is not None:
-                hash_compare_start = time.time()
-                hash_diff = current_hash - hist_hash
-                hash_compare_time += time.time() - hash_compare_start
+        # 第二步：32×32缩略图MSE早筛，剩余候选一次性批量计算SSIM
+        if (best_match_slot < 0 and candidates and current_thumbnail is not None
+                and history.gray.shape[1:] == current_thumbnail[0].shape):
+            ssim_compare_start = _t()
+            current_gray, current_tiny = current_thumbnail
 
-                # 记录哈希差值（用于日志输出）
-                detected_hash_diff = hash_diff
+            # 所有候选的32×32缩略图一次性计算MSE
+            slots = np.array([slot for slot, _ in candidates])
+            mse = np.square(history.tiny[slots] - current_tiny).mean(axis=(1, 2))
+            keep = mse <= self.tiny_mse_reject
+            survivors = [c for c, k in zip(candidates, keep) if k]
 
-                if hash_diff <= hash_threshold:
-                    # 如果同时启用了SSIM检测，需要验证SSIM
-                    if self.use_ssim_var.get():
-                        ssim_compare_start = time.time()
-                        ssim_value, ssim_elapsed = self.calculate_ssim_fast(frame, hist_frame)
-                        ssim_compare_time += ssim_elapsed
+            if survivors:
+                ssim_values = self.calculate_ssim_batch(current_gray, history.gray[slots[keep]])
 
-                        # 记录SSIM值（用于日志输出）
-                        detected_ssim_value = ssim_value
+                # 记录SSIM值（用于日志输出）
+                detected_ssim_value = float(ssim_values.max())
 
-                        if ssim_value >= ssim_threshold:
-                            best_match_idx = i
+                for (slot, hash_diff), ssim_value in zip(survivors, ssim_values):
+                    if ssim_value >= ssim_threshold:
+                        ssim_value = float(ssim_value)
+                        detected_ssim_value = ssim_value
+                        best_match_slot = slot
+                        best_ssim_value = ssim_value
+                        if hash_diff is not None:
                             best_match_reason = f"哈希({hash_diff})和SSIM({ssim_value:.3f})匹配"
                             best_hash_diff = hash_diff
-                            best_ssim_value = ssim_value
-                            break
-                    else:
-                        # 只使用哈希检测
-                        best_match_idx = i
-                        best_match_reason = f"哈希匹配(差异:{hash_diff})"
-                        best_hash_diff = hash_diff
+                            detected_hash_diff = hash_diff
+                        else:
+                            best_match_reason = f"SSIM匹配({ssim_value:.3f})"
                         break
-            # 如果只使用SSIM检测
-            elif self.use_ssim_var.get() and current_thumbnail is not None and hist_thumbnail is not None:
-                ssim_compare_start = time.time()
-                ssim_value, ssim_elapsed = self.calculate_ssim_fast(frame, hist_frame)
-                ssim_compare_time += ssim_elapsed
-
-                # 记录SSIM值（用于日志输出）
-                detected_ssim_value = ssim_value
-
-                if ssim_value >= ssim_threshold:
-                    best_match_idx = i
-                    best_match_reason = f"SSIM匹配({ssim_value:.3f})"
-                    best_ssim_value = ssim_value
-                    break
+            ssim_compare_time = _t() - ssim_compare_start
 
-        compare_time = time.time() - compare_start
-        total_elapsed = time.time() - total_start_time
+        compare_time = _t() - compare_start
+        total_elapsed = _t() - total_start_time
 
         # 构建检测值字符串
         detection_values = []
-        if self.use_hash_var.get() and detected_hash_diff is not None:
+        if self.use_hash and detected_hash_diff is not None:
             detection_values.append(f"哈希差: {detected_hash_diff}")
-        if self.use_ssim_var.get() and detected_ssim_value is not None:
+        if self.use_ssim and detected_ssim_value is not None:
             detection_values.append(f"SSIM: {detected_ssim_value:.3f}")
 
         detection_str = "，".join(detection_values)
 
-        if best_match_idx >= 0:
-            # 找到匹配的帧
-            matched_sr_result = self.frame_sr_history[best_match_idx]
-            matched_frame_idx = self.frame_idx_history[best_match_idx]
-
-            # 构建详细的时间统计
+        # 构建详细的时间统计（仅详细日志模式）
+        time_str = ""
+        if self.verbose_dup_log:
             time_stats = []
             if hash_time > 0:
                 time_stats.append(f"哈希:{hash_time:.3f}s")
@@ -1550,8 +1891,18 @@ class APISRVideoProcessor:
                 time_stats.append(f"哈希比较:{hash_compare_time:.3f}s")
             if ssim_compare_time > 0:
                 time_stats.append(f"SSIM比较:{ssim_compare_time:.3f}s")
+            time_str = "，".join(time_stats)
+
+        self._segment_dup_checked += 1
+
+        if best_match_slot >= 0:
+            # 找到匹配的帧
+            matched_sr_result = history.sr[best_match_slot]
+            matched_frame_idx = int(history.idx[best_match_slot])
 
-            time_str = "，".join(time_stats) if time_stats else ""
+            if best_hash_diff is not None:
+                self._segment_dup_hash_diff_sum += best_hash_diff
+                self._segment_dup_hash_matches += 1
 
             # 构建日志消息
             log_message = f"帧 {frame_idx:04d}: 与帧 {matched_frame_idx:04d} 重复"
@@ -1559,7 +1910,7 @@ class APISRVideoProcessor:
                 log_message += f" ({detection_str})"
             if time_str:
                 log_message += f" [{time_str}]"
-            log_message += f" - 总耗时:{total_elapsed:.3f}s"
+                log_message += f" - 总耗时:{total_elapsed:.3f}s"
 
             self.log(log_message)
 
@@ -1567,103 +1918,125 @@ class APISRVideoProcessor:
             self.update_dup_info(self.dup_frame_count)
 
             # 更新历史帧信息（将匹配帧移到最近位置）
-            if best_match_idx > 0:  # 如果不是已经在最前面
-                # 重新排列历史记录，将匹配帧移到最近位置
-                items_to_move = [
-                    self.frame_history[best_match_idx],
-                    self.frame_hash_history[best_match_idx],
-                    self.frame_thumbnail_history[best_match_idx] if self.use_ssim_var.get() else None,
-                    self.frame_sr_history[best_match_idx],
-                    self.frame_idx_history[best_match_idx]
-                ]
+            history.touch(best_match_slot)
 
-                # 移除匹配帧
-                del self.frame_history[best_match_idx]
-                del self.frame_hash_history[best_match_idx]
-                if self.use_ssim_var.get():
-                    del self.frame_thumbnail_history[best_match_idx]
-                del self.frame_sr_history[best_match_idx]
-                del self.frame_idx_history[best_match_idx]
-
-                # 插入到最前面（最近位置）
-                self.frame_history.appendleft(items_to_move[0])
-                self.frame_hash_history.appendleft(items_to_move[1])
-                if self.use_ssim_var.get():
-                    self.frame_thumbnail_history.appendleft(items_to_move[2])
-                self.frame_sr_history.appendleft(items_to_move[3])
-                self.frame_idx_history.appendleft(items_to_move[4])
-
-            return True, matched_sr_result.copy(), current_hash, current_thumbnail
-
-        # 如果没有找到匹配帧
-        else:
-            # 构建详细的时间统计
-            time_stats = []
-            if hash_time > 0:
-                time_stats.append(f"哈希:{hash_time:.3f}s")
-            if ssim_thumbnail_time > 0:
-                time_stats.append(f"缩略图:{ssim_thumbnail_time:.3f}s")
-            if hash_compare_time > 0:
-                time_stats.append(f"哈希比较:{hash_compare_time:.3f}s")
-            if ssim_compare_time > 0:
-                time_stats.append(f"SSIM比较:{ssim_compare_time:.3f}s")
-
-            time_str = "，".join(time_stats) if time_stats else ""
+            # 返回缓存中的视图，调用方需在缓存下次写入前用完
+            return True, matched_sr_result, current_hash, current_thumbnail
 
-            # 构建日志消息
+        # 未找到匹配帧：只在详细日志模式下逐帧输出
+        if self.verbose_dup_log:
             log_message = f"帧 {frame_idx:04d}: 未重复"
             if detection_str:
                 log_message += f" ({detection_str})"
             if time_str:
                 log_message += f" [{time_str}]"
-
-            # 只在检测耗时较长时输出日志
-            if total_elapsed > 0.05:  # 只记录耗时较长的检测
-                log_message += f" - 总耗时:{total_elapsed:.3f}s"
-                self.log(log_message)
+            log_message += f" - 总耗时:{total_elapsed:.3f}s"
+            self.log(log_message)
 
         return False, None, current_hash, current_thumbnail
 
-    def add_frame_to_history(self, frame, frame_hash, frame_thumbnail, sr_result, frame_idx):
-        """添加帧到历史记录"""
-        # 添加帧数据
-        self.frame_history.append(frame.copy())
-        self.frame_hash_history.append(frame_hash)
-        if self.use_ssim_var.get():
-            self.frame_thumbnail_history.append(frame_thumbnail)
-
-        self.frame_sr_history.append(sr_result.copy() if sr_result is not None else None)
-        self.frame_idx_history.append(frame_idx)
+    def add_frame_to_history(self, frame_hash, frame_thumbnail, sr_result, frame_idx):
+        """添加帧到历史记录（写入环形缓存的槽位）"""
+        if sr_result is None:
+            return
+        self.history.push(frame_hash, frame_thumbnail if self.use_ssim else None, sr_result, frame_idx)
+
+    def run_ffmpeg(self, cmd):
+        """运行ffmpeg命令，只在失败时解码stderr，避免缓冲整段日志"""
+        proc = subprocess.run(cmd, check=False, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, cmd,
+                                                stderr=proc.stderr.decode('utf-8', 'replace'))
+        return proc
+
+    def detect_h264_encoder(self):
+        """检测可用的H.264硬件编码器（NVENC/QSV/AMF），都不可用时使用libx264；结果缓存"""
+        if self._h264_encoder is None:
+            self._h264_encoder = 'libx264'
+            for encoder in ('h264_nvenc', 'h264_qsv', 'h264_amf'):
+                # 用一小段测试画面实际编码一次，仅出现在-encoders列表中不代表有对应的显卡
+                cmd = [
+                    self._ffmpeg, '-y',
+                    '-f', 'lavfi', '-i', 'color=c=black:s=256x256:d=0.1',
+                    '-c:v', encoder,
+                    '-f', 'null', '-',
+                    '-loglevel', 'error',
+                ]
+                try:
+                    self.run_ffmpeg(cmd)
+                except (subprocess.CalledProcessError, OSError):
+                    continue
+                self._h264_encoder = encoder
+                break
+            self.log(f"视频编码器: {self._h264_encoder}")
+        return self._h264_encoder
+
+    def h264_args(self, crf, encoder=None):
+        """返回H.264编码参数；硬件编码器用恒定质量参数近似对应libx264的CRF"""
+        encoder = encoder or self.detect_h264_encoder()
+        if encoder == 'h264_nvenc':
+            return ['-c:v', encoder, '-preset', 'p4', '-rc', 'vbr', '-cq', str(crf), '-b:v', '0']
+        if encoder == 'h264_qsv':
+            return ['-c:v', encoder, '-preset', 'medium', '-global_quality', str(crf)]
+        if encoder == 'h264_amf':
+            return ['-c:v', encoder, '-quality', 'balanced', '-rc', 'cqp',
+                    '-qp_i', str(crf), '-qp_p', str(crf)]
+        return ['-c:v', 'libx264', '-preset', 'medium', '-crf', str(crf)]
+
+    def run_ffmpeg_encode(self, cmd, video_args, crf):
+        """运行H.264编码命令；硬件编码失败（如分辨率超出硬件上限）时改用libx264重试
+
+        video_args是命令中由h264_args(crf)生成的参数段。libx264重试成功后，后续编码都直接使用libx264，
+        不再每次先跑一遍失败的硬件编码
+        """
+        try:
+            return self.run_ffmpeg(cmd)
+        except subprocess.CalledProcessError as e:
+            encoder = video_args[1]
+            n = len(video_args)
+            i = next((i for i in range(len(cmd) - n + 1) if cmd[i:i + n] == video_args), None)
+            if encoder == 'libx264' or i is None:
+                raise
+            self.log(f"硬件编码器 {encoder} 编码失败，改用libx264: {e.stderr}")
+
+        proc = self.run_ffmpeg(cmd[:i] + self.h264_args(crf, 'libx264') + cmd[i + n:])
+        if self._h264_encoder != 'libx264':
+            self._h264_encoder = 'libx264'
+            self.log("后续编码改用libx264")
+        return proc
 
     def extract_audio(self, video_path, audio_path):
-        """提取音频"""
-        start_time = time.time()
+        """提取音频：优先流复制，音轨不是AAC等无法直接复制时用ffmpeg重新编码为AAC"""
+        start_time = _t()
 
         cmd = [
-            'ffmpeg', '-y',
+            self._ffmpeg, '-y',
             '-i', video_path,
             '-vn',
             '-acodec', 'copy',
-            '-loglevel', 'quiet',
+            '-loglevel', 'error',
             audio_path
         ]
 
         try:
-            subprocess.run(cmd, check=True, capture_output=True, text=True)
-
-            elapsed = time.time() - start_time
-            self.log(f"音频提取耗时: {elapsed:.2f}秒")
-            return True
+            self.run_ffmpeg(cmd)
         except subprocess.CalledProcessError as e:
-            self.log(f"提取音频失败: {e.stderr}")
-            return False
+            self.log(f"音频流复制失败，改为重新编码为AAC: {e.stderr}")
+            cmd[cmd.index('-acodec'):cmd.index('-acodec') + 2] = ['-c:a', 'aac', '-b:a', '192k']
+            try:
+                self.run_ffmpeg(cmd)
+            except subprocess.CalledProcessError as e:
+                self.log(f"提取音频失败: {e.stderr}")
+                return False
+
+        elapsed = _t() - start_time
+        self.log(f"音频提取耗时: {elapsed:.2f}秒")
+        return True
 
     def split_video_by_keyframes(self, video_path, segment_duration, output_dir):
         """按关键帧分割视频"""
         self.log(f"开始分割视频: {os.path.basename(video_path)}")
-        start_time = time.time()
-
-        segments = []
+        start_time = _t()
 
         # 创建分段目录
         segment_dir = os.path.join(output_dir, "01_original_segments")
@@ -1671,9 +2044,10 @@ class APISRVideoProcessor:
 
         # 使用ffmpeg分割视频
         segment_pattern = os.path.join(segment_dir, "segment_%03d.mp4")
+        segment_list = os.path.join(segment_dir, "segments_list.txt")
 
         cmd = [
-            'ffmpeg', '-y',
+            self._ffmpeg, '-y',
             '-i', video_path,
             '-c', 'copy',
             '-map', '0',
@@ -1681,28 +2055,52 @@ class APISRVideoProcessor:
             '-f', 'segment',
             '-reset_timestamps', '1',
             '-segment_format', 'mp4',
-            '-segment_list', os.path.join(segment_dir, "segments_list.txt"),
+            '-segment_list', segment_list,
+            '-loglevel', 'error',
             segment_pattern
         ]
 
         try:
-            subprocess.run(cmd, check=True, capture_output=True, text=True)
+            self.run_ffmpeg(cmd)
+        except subprocess.CalledProcessError as e:
+            self.log(f"流复制分割失败，改为重新编码分割: {e.stderr}")
 
-            # 获取生成的分段文件
-            for f in sorted(os.listdir(segment_dir)):
+            # 清理流复制留下的不完整分段
+            for f in os.listdir(segment_dir):
                 if f.startswith("segment_") and f.endswith(".mp4"):
-                    segment_file = os.path.join(segment_dir, f)
-                    segments.append(segment_file)
+                    os.remove(os.path.join(segment_dir, f))
+
+            # 只重新编码视频流，并在每个分段边界强制插入关键帧
+            copy_idx = cmd.index('-c')
+            cmd_reencode = cmd[:copy_idx] + [
+                '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18',
+                '-force_key_frames', f'expr:gte(t,n_forced*{segment_duration})',
+                '-c:a', 'copy',
+            ] + cmd[copy_idx + 2:]
+            try:
+                self.run_ffmpeg(cmd_reencode)
+            except subprocess.CalledProcessError as e2:
+                self.log(f"视频分割失败: {e2.stderr}")
+                return []
 
-            elapsed = time.time() - start_time
-            self.log(f"视频分割完成，共{len(segments)}段，耗时: {elapsed:.2f}秒")
+        # 获取生成的分段文件：直接读取ffmpeg写出的分段列表，不再扫描目录
+        try:
+            with open(segment_list, 'r', encoding='utf-8') as f:
+                segments = [os.path.join(segment_dir, os.path.basename(line.strip())) for line in f if line.strip()]
+        except OSError:
+            segments = [os.path.join(segment_dir, f) for f in sorted(os.listdir(segment_dir))
+                        if f.startswith("segment_") and f.endswith(".mp4")]
 
-        except subprocess.CalledProcessError as e:
-            self.log(f"视频分割失败: {e.stderr}")
-            return []
+        elapsed = _t() - start_time
+        self.log(f"视频分割完成，共{len(segments)}段，耗时: {elapsed:.2f}秒")
 
         return segments
 
+    def get_weight_path(self, model_name, scale):
+        """返回模型在指定缩放倍数下的权重文件路径"""
+        weight = self.models[model_name]["weight"]
+        return weight[str(scale)] if isinstance(weight, dict) else weight
+
     def load_model(self):
         """加载模型（测试模式下不加载）"""
         if self.test_mode_var.get():
@@ -1712,11 +2110,7 @@ class APISRVideoProcessor:
         model_name = self.model_var.get()
         scale = int(self.scale_var.get())
 
-        # 确定权重路径
-        if model_name == "RRDB":
-            weight_path = self.models[model_name]["weight"][str(scale)]
-        else:
-            weight_path = self.models[model_name]["weight"]
+        weight_path = self.get_weight_path(model_name, scale)
 
         # 检查权重文件是否存在
         if not os.path.exists(weight_path):
@@ -1726,8 +2120,27 @@ class APISRVideoProcessor:
         self.log(f"权重文件: {weight_path}")
 
         # 设置数据类型
-        if self.float16_var.get():
-            torch.backends.cudnn.benchmark = True
+        dtype_name = self.dtype_var.get()
+        capability = self._gpu_capability
+        if capability is None and torch.cuda.is_available():
+            capability = torch.cuda.get_device_capability(0)
+        if not torch.cuda.is_available():
+            if dtype_name != "FP32":
+                # 没有CUDA时在CPU上推理，半精度卷积很慢或未实现，统一使用FP32
+                self.log(f"未检测到CUDA，{dtype_name}改用FP32在CPU上推理")
+                dtype_name = "FP32"
+        elif dtype_name == "BF16" and not (capability and capability >= (8, 0)):
+            # BF16需要Ampere(SM 8.0)及以上，旧显卡退回FP16
+            self.log("当前GPU不支持BF16，改用FP16")
+            dtype_name = "FP16"
+
+        # 同一片段内输入尺寸固定，让cuDNN为每种尺寸挑选最快的卷积算法（与精度无关）
+        torch.backends.cudnn.benchmark = True
+
+        if dtype_name == "BF16":
+            self.weight_dtype = torch.bfloat16
+            self.log("使用BF16推理模式（加速，数值范围与FP32相同）")
+        elif dtype_name == "FP16":
             self.weight_dtype = torch.float16
             self.log("使用FP16推理模式（加速）")
         else:
@@ -1735,7 +2148,7 @@ class APISRVideoProcessor:
             self.log("使用FP32推理模式（质量优先）")
 
         # 加载模型
-        model_load_start = time.time()
+        model_load_start = _t()
         if model_name == "GRL":
             generator = self.load_grl(weight_path, scale=scale)
         elif model_name == "DAT":
@@ -1751,108 +2164,203 @@ class APISRVideoProcessor:
         generator.eval()
 
         # 移动到GPU
+        self.channels_last = False
+        self._eager_generator = None
         if torch.cuda.is_available():
             generator = generator.cuda()
 
-        model_load_end = time.time()
+            # 卷积模型使用channels_last布局，cuDNN可走Tensor Core内核
+            # （GRL/DAT内部大量view/reshape，保持默认布局）
+            if model_name in ("RRDB", "CUNET"):
+                generator = generator.to(memory_format=torch.channels_last)
+                self.channels_last = True
+                self.log("使用channels_last内存布局")
+
+            # 可选：torch.compile（reduce-overhead模式使用CUDA Graph，同一视频帧尺寸固定可反复重放）
+            if self.compile_var.get() and hasattr(torch, 'compile'):
+                self._eager_generator = generator
+                generator = torch.compile(generator, mode='reduce-overhead')
+                self.log("已启用torch.compile（首帧需要编译，耗时较长）")
+
+        model_load_end = _t()
         self.log(f"模型加载总耗时: {model_load_end - model_load_start:.2f}秒")
 
         return generator
 
-    def process_single_frame(self, frame):
-        """处理单帧图像 - 修复内存泄漏版本"""
-        start_time = time.time()
+    def get_h2d_buffer(self, height, width):
+        """获取复用的上传缓冲区（锁页内存），尺寸变化时重新分配"""
+        if self._h2d_buf is None or tuple(self._h2d_buf.shape) != (height, width, 3):
+            pin = torch.cuda.is_available()
+            self._h2d_buf = torch.empty((height, width, 3), dtype=torch.uint8, pin_memory=pin)
+            if pin and self._copy_stream is None:
+                self._copy_stream = torch.cuda.Stream()
+        return self._h2d_buf
+
+    def get_d2h_buffer(self, shape):
+        """获取复用的下载缓冲区（锁页内存），尺寸变化时重新分配"""
+        if self._d2h_buf is None or tuple(self._d2h_buf.shape) != shape:
+            self._d2h_buf = torch.empty(shape, dtype=torch.uint8, pin_memory=torch.cuda.is_available())
+        return self._d2h_buf
+
+    def get_device_buffer(self, name, shape, dtype, channels_last=False):
+        """获取复用的GPU张量，形状、类型或内存布局变化时重新分配"""
+        fmt = torch.channels_last if channels_last else torch.contiguous_format
+        buf = self._dev_bufs.get(name)
+        if buf is None or tuple(buf.shape) != shape or buf.dtype != dtype or not buf.is_contiguous(memory_format=fmt):
+            buf = torch.empty(shape, dtype=dtype, device='cuda', memory_format=fmt)
+            self._dev_bufs[name] = buf
+        return buf
+
+    def get_resize_plan(self, h, w):
+        """返回(模型输入尺寸, 裁剪后尺寸, 放大后需缩放到的输出尺寸或None)，同一分辨率只计算一次"""
+        key = (h, w, self.sr_scale, self.downsample_px, self.crop_for_4x)
+        if self._resize_plan is None or self._resize_plan[0] != key:
+            scale = self.sr_scale
+            in_h, in_w = h, w
+            output_size = None
 
-        if self.test_mode_var.get():
-            # 测试模式不处理，直接返回RGB格式
-            elapsed = time.time() - start_time
-            return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)  # 返回RGB格式
-
-        from torchvision.transforms import ToTensor
+            # 下采样（如果需要）
+            short_side = min(h, w)
+            if self.downsample_px != -1 and short_side > self.downsample_px:
+                rescale_factor = short_side / self.downsample_px
+                in_h, in_w = int(h / rescale_factor), int(w / rescale_factor)
+                output_size = (int(w * scale), int(h * scale))
+
+            # 裁剪（如果需要）：上传后在GPU上切片
+            crop_h, crop_w = in_h, in_w
+            if self.crop_for_4x and scale == 4:
+                crop_h, crop_w = 4 * (in_h // 4), 4 * (in_w // 4)
+
+            self._resize_plan = (key, (in_h, in_w), (crop_h, crop_w), output_size)
+        return self._resize_plan[1:]
+
+    def release_transfer_buffers(self):
+        """释放传输缓冲区"""
+        self._h2d_buf = None
+        self._d2h_buf = None
+        self._copy_stream = None
+        self._dev_bufs = {}
+
+    def process_single_frame(self, frame, rgb=False):
+        """处理单帧图像 - 修复内存泄漏版本
+
+        frame默认为BGR（rgb=True时为RGB），返回相同通道顺序的超分结果；通道交换在GPU上完成
+        """
+        start_time = _t()
+
+        if self.test_mode:
+            # 测试模式不处理，直接返回原帧
+            elapsed = _t() - start_time
+            return frame
 
         # 预处理阶段时间统计
-        preprocess_start = time.time()
-
-        # 预处理 - 转换为RGB
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, _ = frame_rgb.shape
-        original_h, original_w = h, w
-
-        # 下采样（如果需要）
-        scale = int(self.scale_var.get())
-        downsample_threshold = int(self.downsample_threshold.get())
+        preprocess_start = _t()
 
-        short_side = min(h, w)
+        # 预处理 - 保持原通道顺序，通道交换和裁剪放到GPU上做
+        original_h, original_w = frame.shape[:2]
+        (h, w), (crop_h, crop_w), output_size = self.get_resize_plan(original_h, original_w)
 
-        if downsample_threshold != -1 and short_side > downsample_threshold:
-            rescale_factor = short_side / downsample_threshold
-            new_w = int(w / rescale_factor)
-            new_h = int(h / rescale_factor)
-            frame_rgb = cv2.resize(frame_rgb, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
-            # 立即清理中间变量
-            del frame
-            frame = None
-
-        # 裁剪（如果需要）
-        if self.crop_for_4x_var.get() and scale == 4:
-            h, w, _ = frame_rgb.shape
-            if h % 4 != 0:
-                frame_rgb = frame_rgb[:4 * (h // 4), :, :]
-            if w % 4 != 0:
-                frame_rgb = frame_rgb[:, :4 * (w // 4), :]
-
-        preprocess_time = time.time() - preprocess_start
+        preprocess_time = _t() - preprocess_start
 
         # 推理阶段时间统计
-        inference_start = time.time()
-
-        # 转换为tensor并进行推理
-        img_tensor = ToTensor()(frame_rgb).unsqueeze(0)  # 形状: [1, 3, H, W]
-
-        # 立即清理不再需要的变量
-        del frame_rgb
-        frame_rgb = None
-
-        if torch.cuda.is_available():
-            img_tensor = img_tensor.cuda()
+        inference_start = _t()
 
-        img_tensor = img_tensor.to(dtype=self.weight_dtype)
+        # 直接写入复用的锁页内存缓冲区（下采样时resize的输出即缓冲区），再异步上传到GPU
+        h2d_buf = self.get_h2d_buffer(h, w)
+        if (h, w) != (original_h, original_w):
+            cv2.resize(frame, (w, h), dst=h2d_buf.numpy(), interpolation=cv2.INTER_LINEAR)
+        else:
+            np.copyto(h2d_buf.numpy(), frame)
+
+        # 模型输入/输出为RGB，BGR帧按(2, 1, 0)取通道
+        channels = (0, 1, 2) if rgb else (2, 1, 0)
+
+        # GPU上的张量都复用同一组缓冲区：上一帧结束前已同步拷贝流，这里可以直接覆盖
+        use_cuda = torch.cuda.is_available()
+        if use_cuda:
+            compute_stream = torch.cuda.current_stream()
+            img_u8 = self.get_device_buffer('frame_u8', (h, w, 3), torch.uint8)
+            with torch.cuda.stream(self._copy_stream):
+                img_u8.copy_(h2d_buf, non_blocking=True)
+            compute_stream.wait_stream(self._copy_stream)
+        else:
+            img_u8 = h2d_buf
+
+        if (crop_h, crop_w) != (h, w):
+            img_u8 = img_u8[:crop_h, :crop_w]
+
+        # 形状: [1, 3, H, W]，数值范围0-1
+        if use_cuda:
+            img_tensor = self.get_device_buffer('model_input', (1, 3, crop_h, crop_w), self.weight_dtype,
+                                                self.channels_last)
+            for dst, src in enumerate(channels):
+                img_tensor[0, dst].copy_(img_u8[..., src])
+            img_tensor.div_(255.0)
+        else:
+            img_chw = img_u8.permute(2, 0, 1)
+            if not rgb:
+                img_chw = img_chw.flip(0)
+            img_tensor = img_chw.unsqueeze(0).to(dtype=self.weight_dtype).div_(255.0)
+            if self.channels_last:
+                img_tensor = img_tensor.contiguous(memory_format=torch.channels_last)
 
         # 推理
-        with torch.no_grad():
-            result = self.generator(img_tensor)
+        with torch.inference_mode():
+            try:
+                result = self.generator(img_tensor)
+            except Exception as e:
+                if self._eager_generator is None:
+                    raise
+                # 编译失败（如缺少triton）时退回普通模式
+                self.log(f"torch.compile失败，退回普通推理: {e}")
+                self.generator = self._eager_generator
+                self._eager_generator = None
+                result = self.generator(img_tensor)
+
+            # 在GPU上完成通道交换（BGR输入时）、截断和uint8转换，只回传8位数据
+            # （不原地修改输出，CUDA Graph的输出缓冲区会在下次重放时复用）
+            if use_cuda:
+                out_shape = tuple(result.shape[1:])
+                result_f = self.get_device_buffer('result', out_shape, result.dtype)
+                for dst, src in enumerate(channels):
+                    result_f[dst].copy_(result[0, src])
+                result_f.clamp_(0, 1).mul_(255.0)
+                result_u8 = self.get_device_buffer('result_u8', out_shape, torch.uint8)
+                result_u8.copy_(result_f)
+                result_u8 = result_u8.permute(1, 2, 0)
+            else:
+                result_chw = result[0] if rgb else result[0].flip(0)
+                result_u8 = result_chw.clamp(0, 1).mul_(255.0).to(torch.uint8).permute(1, 2, 0)
 
-        inference_time = time.time() - inference_start
+        inference_time = _t() - inference_start
 
         # 后处理阶段时间统计
-        postprocess_start = time.time()
+        postprocess_start = _t()
+
+        # 通过复用的锁页内存缓冲区下载结果
+        d2h_buf = self.get_d2h_buffer(tuple(result_u8.shape))
+        if use_cuda:
+            self._copy_stream.wait_stream(compute_stream)
+            with torch.cuda.stream(self._copy_stream):
+                d2h_buf.copy_(result_u8, non_blocking=True)
+            self._copy_stream.synchronize()
+        else:
+            d2h_buf.copy_(result_u8)
 
-        # 将结果移动到CPU，并释放GPU内存
-        result_cpu = result[0].cpu().detach()
+        # 缓冲区会被下一帧复用：需要缩放回原始比例时resize的输出就是新数组，否则复制出结果
+        if output_size is not None:
+            result_np = cv2.resize(d2h_buf.numpy(), output_size, interpolation=cv2.INTER_LINEAR)
+        else:
+            result_np = d2h_buf.numpy().copy()
 
         # 立即清理GPU变量
+        del img_u8
         del img_tensor
         del result
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-            torch.cuda.synchronize()
+        del result_u8
 
-        # 转换为numpy数组，调整通道顺序，并缩放到0-255
-        result_np = result_cpu.numpy()
-        result_np = np.transpose(result_np, (1, 2, 0))  # 从 [C, H, W] 转换为 [H, W, C]
-        result_np = np.clip(result_np * 255.0, 0, 255).astype(np.uint8)
-
-        # 清理中间变量
-        del result_cpu
-
-        # 如果需要，缩放回原始大小
-        if downsample_threshold != -1 and short_side > downsample_threshold:
-            output_h = int(original_h * scale)
-            output_w = int(original_w * scale)
-            result_np = cv2.resize(result_np, (output_w, output_h), interpolation=cv2.INTER_LINEAR)
-
-        postprocess_time = time.time() - postprocess_start
-        total_elapsed = time.time() - start_time
+        postprocess_time = _t() - postprocess_start
+        total_elapsed = _t() - start_time
 
         # 记录详细的时间统计（只记录耗时较长的帧处理）
         if total_elapsed > 0.2:  # 只记录超过200ms的帧处理
@@ -1863,7 +2371,7 @@ class APISRVideoProcessor:
 
     def process_frame_with_enhanced_dup_detect(self, frame, frame_idx):
         """处理单帧，包含增强的重复帧检测 - 修复内存泄漏版本"""
-        start_time = time.time()
+        start_time = _t()
         is_duplicate = False
 
         try:
@@ -1872,59 +2380,27 @@ class APISRVideoProcessor:
                 self.check_frame_duplicate_enhanced(frame, frame_idx)
 
             if is_duplicate and matched_sr_result is not None:
-                # 找到重复帧，直接使用历史超分辨率结果
-                result_np = matched_sr_result.copy()  # 创建副本
-
-                # 计算当前帧的信息（如果需要）
-                if current_hash is None and self.use_hash_var.get():
-                    current_hash, _ = self.calculate_frame_hash(frame)
-                if current_thumbnail is None and self.use_ssim_var.get():
-                    h, w = frame.shape[:2]
-                    if h > 180 or w > 320:
-                        new_h = 180
-                        new_w = int(w * (180 / h))
-                        current_thumbnail = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
-                    else:
-                        current_thumbnail = frame.copy()
-
-                # 添加帧到历史记录
-                self.add_frame_to_history(frame, current_hash, current_thumbnail, result_np, frame_idx)
-
-                total_elapsed = time.time() - start_time
-                return result_np, current_hash, current_thumbnail, is_duplicate
+                # 找到重复帧，直接返回缓存中的超分结果（不调用模型）
+                # 匹配的槽位已移到最近位置，不再复制整帧写入新槽位；
+                # 返回的是缓存视图，调用方需在下一帧处理前用完（逐帧循环中异步写盘前会先复制）
+                return matched_sr_result, current_hash, current_thumbnail, is_duplicate
 
             # 非重复帧，进行超分辨率处理
-            process_start = time.time()
+            process_start = _t()
             result_np = self.process_single_frame(frame)
-            process_time = time.time() - process_start
+            process_time = _t() - process_start
 
-            # 计算当前帧的信息
-            if self.use_hash_var.get():
-                hash_start = time.time()
-                if current_hash is None:
-                    current_hash, hash_time = self.calculate_frame_hash(frame)
-                else:
-                    hash_time = time.time() - hash_start
-            else:
-                hash_time = 0
-
-            if self.use_ssim_var.get() and current_thumbnail is None:
-                h, w = frame.shape[:2]
-                if h > 180 or w > 320:
-                    new_h = 180
-                    new_w = int(w * (180 / h))
-                    current_thumbnail = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
-                else:
-                    current_thumbnail = frame.copy()
+            # 计算当前帧的信息（与检测时相同：先缩略图，哈希复用缩略图）
+            if self.use_ssim and current_thumbnail is None:
+                current_thumbnail = self.make_dup_thumbnail(frame)
+            if self.use_hash and current_hash is None:
+                current_hash, _ = self.calculate_frame_hash(
+                    current_thumbnail[0] if current_thumbnail is not None else frame)
 
             # 更新历史记录
-            self.add_frame_to_history(frame, current_hash, current_thumbnail, result_np, frame_idx)
+            self.add_frame_to_history(current_hash, current_thumbnail, result_np, frame_idx)
 
-            total_time = time.time() - start_time
-
-            # 定期清理内存
-            if frame_idx % 50 == 0:
-                self.cleanup_memory()
+            total_time = _t() - start_time
 
             if total_time > 0.3:  # 只记录耗时较长的帧处理
                 self.log(f"帧 {frame_idx:04d}: 超分处理耗时: {process_time:.3f}s，总耗时: {total_time:.3f}s")
@@ -1964,11 +2440,7 @@ class APISRVideoProcessor:
 
         if os.path.exists(frames_dir):
             # 查找所有after文件夹
-            after_dirs = []
-            for item in os.listdir(frames_dir):
-                item_path = os.path.join(frames_dir, item)
-                if os.path.isdir(item_path) and item.endswith("_after"):
-                    after_dirs.append(item_path)
+            after_dirs = self.list_subdirs(frames_dir, "_after")
 
             if after_dirs:
                 # 按文件夹名排序（最新的在前）
@@ -2017,55 +2489,92 @@ class APISRVideoProcessor:
         self.log(f"进度检测结果: 下一个片段={next_segment}, 当前帧={current_frame}")
         return next_segment, current_frame, processed_segments
 
+    def _open_capture(self, path):
+        """打开视频：优先使用硬件解码（FFmpeg后端，如NVDEC），不支持时退回软件解码"""
+        if hasattr(cv2, 'CAP_PROP_HW_ACCELERATION'):
+            try:
+                cap = cv2.VideoCapture(path, cv2.CAP_FFMPEG,
+                                       [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+            except cv2.error:
+                cap = None
+            if cap is not None and cap.isOpened():
+                if int(cap.get(cv2.CAP_PROP_HW_ACCELERATION)) != cv2.VIDEO_ACCELERATION_NONE:
+                    self.log("使用硬件解码")
+                return cap
+            if cap is not None:
+                cap.release()
+        return cv2.VideoCapture(path)
+
+    def submit_frame_write(self, path, image):
+        """提交一帧到后台线程写盘，未完成的写入过多时先等待最早的一个"""
+        while len(self._write_futures) >= self._max_pending_writes:
+            self._check_frame_write(self._write_futures.popleft())
+        self._write_futures.append((path, self._writer_pool.submit(self._write_frame_file, path, image)))
+
+    def _write_frame_file(self, path, image):
+        """在写入线程中保存帧：先写临时文件再重命名，中断时不会留下不完整的frame_*.png"""
+        folder, name = os.path.split(path)
+        tmp_path = os.path.join(folder, "tmp_" + name)
+        if not cv2.imwrite(tmp_path, image):
+            return False
+        os.replace(tmp_path, path)
+        return True
+
+    def wait_frame_writes(self):
+        """等待所有已提交的帧写盘完成"""
+        while self._write_futures:
+            self._check_frame_write(self._write_futures.popleft())
+
+    def _check_frame_write(self, item):
+        """取回一次写盘结果，失败时记录日志"""
+        path, future = item
+        try:
+            if not future.result():
+                self.log(f"警告：帧文件写入失败: {path}")
+        except Exception as e:
+            self.log(f"警告：帧文件写入失败: {path}，{e}")
+
     def process_segment_frames(self, segment_path, segment_index):
         """处理视频片段的所有帧（逐帧处理）- 修复：添加帧位置恢复逻辑"""
         segment_name = os.path.basename(segment_path)
         self.log(f"处理片段 {segment_index}: {segment_name}")
-        segment_start_time = time.time()
+        segment_start_time = _t()
 
-        if self.test_mode_var.get():
+        if self.test_mode:
             self.log("测试模式：仅进行重复帧检测，不进行超分辨率处理")
             # 测试模式不生成视频，但会保留帧文件供检查
             return None, None
 
         # 初始化历史帧缓存
         self.init_history_cache()
+        self._reset_segment_dup_counters()
 
         # 更新重复帧计数（已重置为0）
         self.update_dup_info(self.dup_frame_count)
 
         # 为当前片段创建帧目录（直接创建在03_segment_frames下）
-        setup_start = time.time()
+        setup_start = _t()
         before_dir, after_dir = self.setup_segment_frame_dirs(segment_path)
-        setup_time = time.time() - setup_start
+        setup_time = _t() - setup_start
 
-        if not before_dir or not after_dir:
+        if not after_dir:
             self.log("错误：无法创建帧目录")
             return None, None
 
         self.log(f"目录设置耗时: {setup_time:.2f}秒")
 
-        # 提取音频
-        audio_name = segment_name.replace('.mp4', '.aac')
-        audio_path = os.path.join(self.temp_base_dir, "02_audio", audio_name)
-
-        audio_start = time.time()
-        has_audio = self.extract_audio(segment_path, audio_path)
-        audio_time = time.time() - audio_start
-
-        if has_audio:
-            self.log(f"音频提取成功，耗时: {audio_time:.2f}秒")
-        else:
-            self.log("视频无音频或音频提取失败")
+        # 音频：分割时使用 -map 0 保留了全部流，片段本身就带有音轨，
+        # 封装时直接从原始片段读取音频，省去单独的音频提取ffmpeg进程
+        audio_path = segment_path
 
         # 读取视频
-        cap_start = time.time()
-        cap = cv2.VideoCapture(segment_path)
+        cap_start = _t()
+        cap = self._open_capture(segment_path)
         fps = cap.get(cv2.CAP_PROP_FPS)
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        cap_time = time.time() - cap_start
+        cap_time = _t() - cap_start
 
         if total_frames == 0:
             self.log(f"警告: 无法获取片段 {segment_path} 的帧数")
@@ -2073,8 +2582,8 @@ class APISRVideoProcessor:
             return None, None
 
         # 计算输出尺寸
-        scale = int(self.scale_var.get())
-        downsample_threshold = int(self.downsample_threshold.get())
+        scale = self.sr_scale
+        downsample_threshold = self.downsample_px
 
         short_side = min(height, width)
         if downsample_threshold != -1 and short_side > downsample_threshold:
@@ -2140,6 +2649,14 @@ class APISRVideoProcessor:
                         if success:
                             self.log(f"跳过已存在的帧，从第 {frame_idx + 1} 帧开始")
 
+        # 帧文件路径模板只拼接一次，循环内只做格式化
+        before_fmt = os.path.join(before_dir, "frame_{:06d}.png") if before_dir else None
+        after_fmt = os.path.join(after_dir, "frame_{:06d}.png")
+        progress_scale = 100.0 / total_frames if total_frames > 0 else 0.0
+
+        # 预取若干帧，之后每取走一帧就立即补提交一帧的解码
+        pending_reads = collections.deque(self._io_pool.submit(cap.read) for _ in range(self._read_ahead))
+
         while True:
             # 检查是否被停止
             if self.stopped:
@@ -2156,18 +2673,16 @@ class APISRVideoProcessor:
                     try:
                         # 将模型移动到CPU并释放GPU内存
                         self.generator = self.generator.cpu()
+                        self._dev_bufs.clear()
                         torch.cuda.empty_cache()
                         torch.cuda.synchronize()  # 等待CUDA操作完成
                         self.log("模型已移动到CPU，GPU内存已释放")
                     except Exception as e:
                         self.log(f"移动模型到CPU时出错: {e}")
 
-                # 高效等待，而不是忙等待
-                self.pause_btn.config(text="▶ 继续")
-                self.update_status("已暂停", "orange")
-
-                while self.paused and not self.stopped:
-                    time.sleep(0.5)  # 使用较短的休眠时间以便快速响应
+                # 高效等待，而不是忙等待（按钮文字和状态由主线程的toggle_pause更新）
+                with self.pause_cv:
+                    self.pause_cv.wait_for(lambda: not self.paused or self.stopped)
 
                 # 恢复处理
                 if not self.stopped:
@@ -2179,45 +2694,39 @@ class APISRVideoProcessor:
                         except Exception as e:
                             self.log(f"移动模型回GPU时出错: {e}")
 
-                    self.pause_btn.config(text="⏸ 暂停")
-                    self.update_status("处理中...", "blue")
                     self.log(f"处理继续于片段 {segment_index} 的第 {frame_idx + 1} 帧")
 
                 if self.stopped:
                     break
 
-            # 每处理50帧清理一次内存
-            if frame_idx % 50 == 0:
-                self.cleanup_memory()
-                self.log(f"已清理内存（处理到第 {frame_idx} 帧）")
-
             # 每处理100帧清理一次历史缓存
-            if frame_idx % 100 == 0 and self.enable_dup_detect_var.get():
+            if frame_idx % 100 == 0 and self.dup_enabled:
                 self.clear_history_cache()
                 self.init_history_cache()  # 重新初始化
                 self.log(f"已清空历史缓存（处理到第 {frame_idx} 帧）")
 
-            # 读取帧
-            read_start = time.time()
-            ret, frame = cap.read()
-            read_time = time.time() - read_start
+            # 读取帧（等待预取结果）
+            read_start = _t()
+            ret, frame = pending_reads.popleft().result()
+            read_time = _t() - read_start
             total_io_time += read_time
 
             if not ret:
                 break
 
-            # 保存原始帧到before目录
-            save_start = time.time()
-            before_path = os.path.join(before_dir, f"frame_{frame_idx:06d}.png")
-            cv2.imwrite(before_path, frame)
-            save_time = time.time() - save_start
-            total_io_time += save_time
+            pending_reads.append(self._io_pool.submit(cap.read))
+
+            # 保存原始帧到before目录（仅调试时）
+            if before_fmt is not None:
+                save_start = _t()
+                self.submit_frame_write(before_fmt.format(frame_idx), frame)
+                total_io_time += _t() - save_start
 
             # 使用增强的重复帧检测处理帧
-            process_start = time.time()
+            process_start = _t()
             sr_frame, current_hash, current_thumbnail, is_duplicate = \
                 self.process_frame_with_enhanced_dup_detect(frame, frame_idx)
-            frame_process_time = time.time() - process_start
+            frame_process_time = _t() - process_start
 
             if is_duplicate:
                 total_dup_detect_time += frame_process_time
@@ -2228,11 +2737,13 @@ class APISRVideoProcessor:
             total_frame_time += frame_process_time
 
             # 保存处理后的帧到after目录
-            save_sr_start = time.time()
-            after_path = os.path.join(after_dir, f"frame_{frame_idx:06d}.png")
-            sr_frame_bgr = cv2.cvtColor(sr_frame, cv2.COLOR_RGB2BGR)
-            cv2.imwrite(after_path, sr_frame_bgr)
-            save_sr_time = time.time() - save_sr_start
+            save_sr_start = _t()
+            after_path = after_fmt.format(frame_idx)
+            if is_duplicate:
+                # 重复帧结果是历史缓存的视图，后台写盘期间槽位可能被新帧覆盖
+                sr_frame = sr_frame.copy()
+            self.submit_frame_write(after_path, sr_frame)
+            save_sr_time = _t() - save_sr_start
             total_io_time += save_sr_time
 
             # 添加到帧文件列表
@@ -2249,15 +2760,22 @@ class APISRVideoProcessor:
 
             # 每处理10帧更新一次进度
             if frames_processed % 10 == 0:
-                progress = (self.current_frame_in_segment / total_frames) * 100
-                self.update_progress(progress)
+                self.update_progress(self.current_frame_in_segment * progress_scale)
 
             frame_idx += 1
 
+        # 等待进行中的预取完成后再释放
+        for pending_read in pending_reads:
+            pending_read.result()
         cap.release()
 
+        # 等待所有帧写盘完成（编码视频和断点续处理都依赖完整的帧文件）
+        wait_start = _t()
+        self.wait_frame_writes()
+        total_io_time += _t() - wait_start
+
         # 记录片段处理统计
-        segment_elapsed = time.time() - segment_start_time
+        segment_elapsed = _t() - segment_start_time
         avg_frame_time = total_frame_time / max(frames_processed, 1) if frames_processed > 0 else 0
 
         self.log("=" * 60)
@@ -2272,14 +2790,20 @@ class APISRVideoProcessor:
             self.log(f"  超分辨率处理耗时: {total_sr_time:.2f}秒 ({total_sr_time / segment_elapsed * 100:.1f}%)")
             self.log(f"  文件IO耗时: {total_io_time:.2f}秒 ({total_io_time / segment_elapsed * 100:.1f}%)")
 
-        if self.enable_dup_detect_var.get():
+        if self.dup_enabled:
             dup_percentage = (segment_dup_count / frames_processed * 100) if frames_processed > 0 else 0
-            self.log(f"  检测到重复帧: {segment_dup_count}个 ({dup_percentage:.1f}%)")
+            self.log(f"  检测到重复帧: {segment_dup_count}个 ({dup_percentage:.1f}%)，共检查 {self._segment_dup_checked} 帧")
+            if self._segment_dup_hash_matches:
+                avg_hash_diff = self._segment_dup_hash_diff_sum / self._segment_dup_hash_matches
+                self.log(f"  重复帧平均哈希差: {avg_hash_diff:.2f}（阈值 {self.hash_threshold}）")
             if segment_dup_count > 0:
                 self.log(f"  重复帧节省时间估算: {segment_dup_count * avg_frame_time:.2f}秒")
 
+        self.segment_stats.append(SegmentStats(total_dup_detect_time, total_sr_time, frames_processed,
+                                               segment_dup_count, segment_elapsed))
+
         # 清空历史缓存以释放内存
-        self.clear_history_cache()
+        self.clear_history_cache(release=True)
 
         # 只有在片段完全处理完且没有停止时才生成视频
         if not self.stopped and frame_idx >= total_frames and frame_files:
@@ -2288,10 +2812,10 @@ class APISRVideoProcessor:
                                                   f"processed_{segment_name}")
 
             # 将帧转换为视频
-            encode_start = time.time()
+            encode_start = _t()
             success = self.frames_to_video(frame_files, processed_segment_path, fps, output_width, output_height,
                                            audio_path)
-            encode_time = time.time() - encode_start
+            encode_time = _t() - encode_start
 
             if success:
                 self.log(f"片段视频编码耗时: {encode_time:.2f}秒")
@@ -2302,7 +2826,7 @@ class APISRVideoProcessor:
                 self.log(f"已清理片段 {segment_name} 的帧临时文件 (before和after目录)")
 
                 # 如果有立即合并功能，调用合并
-                if self.immediate_merge_var.get() and not self.test_mode_var.get():
+                if self.immediate_merge and not self.test_mode:
                     self.update_immediate_merge()
 
                 return processed_segment_path, audio_path
@@ -2336,15 +2860,37 @@ class APISRVideoProcessor:
         """将帧序列转换为视频"""
         encoder_mode = self.video_encoder_mode.get()
 
-        if encoder_mode == "ffmpeg" or (encoder_mode == "auto" and not self.check_opencv_encoder_support()):
-            return self.frames_to_video_alternative(frame_files, output_path, fps, width, height, audio_path)
-        else:
+        if encoder_mode == "opencv":
+            return self.frames_to_video_opencv(frame_files, output_path, fps, width, height, audio_path)
+
+        # auto模式优先用ffmpeg（多线程读PNG + H.264编码），失败时再退回OpenCV
+        if self.frames_to_video_alternative(frame_files, output_path, fps, width, height, audio_path):
+            return True
+        if encoder_mode == "auto" and self.check_opencv_encoder_support():
+            self.log("ffmpeg生成视频失败，改用OpenCV编码")
             return self.frames_to_video_opencv(frame_files, output_path, fps, width, height, audio_path)
+        return False
+
+    @staticmethod
+    def frame_sequence_input(frame_files):
+        """帧文件（按生成顺序）是同一目录下编号连续递增的frame_%06d.png时，返回ffmpeg image2序列输入参数，否则返回None"""
+        folder = os.path.dirname(frame_files[0])
+        start = None
+        for offset, frame_file in enumerate(frame_files):
+            match = _FRAME_NAME_RE.match(os.path.basename(frame_file))
+            if match is None or os.path.dirname(frame_file) != folder:
+                return None
+            if start is None:
+                start = int(match.group(1))
+            elif int(match.group(1)) != start + offset:
+                return None
+        return ['-start_number', str(start), '-i', os.path.join(folder, 'frame_%06d.png'),
+                '-frames:v', str(len(frame_files))]
 
     def frames_to_video_opencv(self, frame_files, output_path, fps, width, height, audio_path=None):
         """将帧序列转换为视频（使用OpenCV）"""
         self.log(f"正在生成视频: {output_path}")
-        start_time = time.time()
+        start_time = _t()
 
         if not frame_files:
             self.log("错误: 没有可用的帧文件")
@@ -2395,41 +2941,46 @@ class APISRVideoProcessor:
             return self.frames_to_video_alternative(frame_files, output_path, fps, width, height, audio_path)
 
         # 按顺序写入所有帧
-        write_start = time.time()
+        write_start = _t()
         frame_count = 0
         read_time = 0
         write_time = 0
 
-        for frame_file in sorted(frame_files):
-            if os.path.exists(frame_file):
-                read_start = time.time()
-                frame = cv2.imread(frame_file)
-                read_time += time.time() - read_start
-
-                if frame is not None:
-                    # 确保帧的大小与视频写入器匹配
-                    if frame.shape[1] != width or frame.shape[0] != height:
-                        resize_start = time.time()
-                        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
-                        read_time += time.time() - resize_start
-
-                    # 确保帧是8位无符号整数
-                    if frame.dtype != np.uint8:
-                        frame = frame.astype(np.uint8)
-
-                    write_frame_start = time.time()
-                    out.write(frame)
-                    write_time += time.time() - write_frame_start
+        needs_resize = None
 
-                    frame_count += 1
+        # frame_files由process_segment_frames按帧号顺序生成，无需再排序或逐个检查文件是否存在
+        for frame_file in frame_files:
+            read_start = _t()
+            frame = cv2.imread(frame_file)
+            read_time += _t() - read_start
 
-                    # 每100帧输出一次进度
-                    if frame_count % 100 == 0:
-                        current_time = time.time() - write_start
-                        avg_time_per_frame = current_time / frame_count
-                        self.log(f"已写入 {frame_count} 帧，平均每帧: {avg_time_per_frame:.3f}秒")
+            if frame is None:
+                self.log(f"警告: 无法读取帧文件，已跳过: {frame_file}")
+                continue
 
-        write_total_time = time.time() - write_start
+            # 同一片段所有帧尺寸相同，只在第一帧判断是否需要缩放到视频写入器的尺寸
+            if needs_resize is None:
+                needs_resize = frame.shape[1] != width or frame.shape[0] != height
+                if needs_resize:
+                    self.log(f"帧尺寸 {frame.shape[1]}x{frame.shape[0]} 与输出尺寸不一致，写入前缩放到 {width}x{height}")
+            if needs_resize:
+                resize_start = _t()
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
+                read_time += _t() - resize_start
+
+            write_frame_start = _t()
+            out.write(frame)
+            write_time += _t() - write_frame_start
+
+            frame_count += 1
+
+            # 每100帧输出一次进度
+            if frame_count % 100 == 0:
+                current_time = _t() - write_start
+                avg_time_per_frame = current_time / frame_count
+                self.log(f"已写入 {frame_count} 帧，平均每帧: {avg_time_per_frame:.3f}秒")
+
+        write_total_time = _t() - write_start
         out.release()
 
         # 确保视频文件创建成功
@@ -2444,7 +2995,7 @@ class APISRVideoProcessor:
         # 如果有音频，合并音频和视频
         if audio_path and os.path.exists(audio_path):
             self.log("合并音频和视频...")
-            merge_start = time.time()
+            merge_start = _t()
 
             try:
                 # 如果生成的是AVI文件，需要转换格式
@@ -2452,16 +3003,16 @@ class APISRVideoProcessor:
                     # 先转换为mp4
                     mp4_temp = temp_video_path.replace('.avi', '_converted.mp4')
                     convert_cmd = [
-                        'ffmpeg', '-y',
+                        self._ffmpeg, '-y',
                         '-i', temp_video_path,
                         '-c:v', 'libx264',
                         '-preset', 'medium',
                         '-crf', '23',
-                        '-loglevel', 'quiet',
+                        '-loglevel', 'error',
                         mp4_temp
                     ]
 
-                    subprocess.run(convert_cmd, check=True, capture_output=True, text=True)
+                    self.run_ffmpeg(convert_cmd)
 
                     if os.path.exists(mp4_temp):
                         # 删除原始AVI文件
@@ -2470,25 +3021,27 @@ class APISRVideoProcessor:
 
                 # 合并音频
                 cmd = [
-                    'ffmpeg', '-y',
+                    self._ffmpeg, '-y',
                     '-i', temp_video_path,
                     '-i', audio_path,
+                    '-map', '0:v:0',
+                    '-map', '1:a:0?',
                     '-c:v', 'copy',
                     '-c:a', 'aac',
                     '-b:a', '192k',
                     '-strict', 'experimental',
-                    '-loglevel', 'quiet',
+                    '-loglevel', 'error',
                     output_path
                 ]
 
-                result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+                self.run_ffmpeg(cmd)
 
                 # 删除临时文件
                 if os.path.exists(temp_video_path):
                     os.remove(temp_video_path)
 
-                merge_time = time.time() - merge_start
-                total_time = time.time() - start_time
+                merge_time = _t() - merge_start
+                total_time = _t() - start_time
 
                 self.log(f"音频视频合并成功，耗时: {total_time:.2f}秒")
                 self.log(f"  详细时间: 写入帧{write_total_time:.2f}s, 合并{merge_time:.2f}s")
@@ -2502,20 +3055,22 @@ class APISRVideoProcessor:
                 try:
                     self.log("尝试第二种方法合并音频视频...")
                     cmd2 = [
-                        'ffmpeg', '-y',
+                        self._ffmpeg, '-y',
                         '-i', temp_video_path,
                         '-i', audio_path,
+                        '-map', '0:v:0',
+                        '-map', '1:a:0?',
                         '-c:v', 'libx264',
                         '-preset', 'medium',
                         '-crf', '23',
                         '-c:a', 'aac',
                         '-b:a', '192k',
                         '-strict', 'experimental',
-                        '-loglevel', 'quiet',
+                        '-loglevel', 'error',
                         output_path
                     ]
 
-                    subprocess.run(cmd2, check=True, capture_output=True, text=True)
+                    self.run_ffmpeg(cmd2)
 
                     if os.path.exists(temp_video_path):
                         os.remove(temp_video_path)
@@ -2537,17 +3092,17 @@ class APISRVideoProcessor:
                 if selected_ext == 'avi':
                     self.log("将AVI转换为MP4...")
                     convert_cmd = [
-                        'ffmpeg', '-y',
+                        self._ffmpeg, '-y',
                         '-i', temp_video_path,
                         '-c:v', 'libx264',
                         '-preset', 'medium',
                         '-crf', '23',
-                        '-loglevel', 'quiet',
+                        '-loglevel', 'error',
                         output_path
                     ]
 
                     try:
-                        subprocess.run(convert_cmd, check=True, capture_output=True, text=True)
+                        self.run_ffmpeg(convert_cmd)
                         os.remove(temp_video_path)
                     except Exception as e:
                         self.log(f"转换失败: {e}")
@@ -2555,7 +3110,7 @@ class APISRVideoProcessor:
                 else:
                     shutil.move(temp_video_path, output_path)
 
-                total_time = time.time() - start_time
+                total_time = _t() - start_time
                 self.log(f"视频生成成功，总耗时: {total_time:.2f}秒")
                 self.log(f"生成视频: {output_path}，分辨率: {width}x{height}，帧率: {fps}，帧数: {frame_count}")
                 return True
@@ -2567,79 +3122,83 @@ class APISRVideoProcessor:
     def frames_to_video_alternative(self, frame_files, output_path, fps, width, height, audio_path=None):
         """替代方法：使用ffmpeg直接生成视频（避免OpenCV编码器问题）"""
         self.log("使用ffmpeg直接生成视频...")
-        start_time = time.time()
+        start_time = _t()
 
         if not frame_files:
             self.log("错误: 没有可用的帧文件")
             return False
 
-        # 创建临时文件列表
-        list_file = tempfile.mktemp(suffix=".txt")
-        frame_files_sorted = sorted(frame_files)
-
-        with open(list_file, 'w', encoding='utf-8') as f:
-            for frame_file in frame_files_sorted:
-                f.write(f"file '{os.path.abspath(frame_file)}'\n")
+        # 编号连续时直接用image2序列输入，否则写临时文件列表走concat
+        list_file = None
+        input_args = self.frame_sequence_input(frame_files)
+        if input_args is not None:
+            input_args = ['-framerate', str(fps), *input_args]
+        else:
+            list_file = tempfile.mktemp(suffix=".txt")
+            frame_duration = 1.0 / fps
+            with open(list_file, 'w', encoding='utf-8') as f:
+                f.writelines(f"file '{frame_file}'\nduration {frame_duration:.9f}\n" for frame_file in frame_files)
+            input_args = ['-f', 'concat', '-safe', '0', '-i', list_file, '-r', str(fps)]
 
         # 使用ffmpeg从图像序列生成视频
         temp_video_path = output_path.replace('.mp4', '_temp.mp4')
 
+        video_args = self.h264_args(23)
         cmd = [
-            'ffmpeg', '-y',
-            '-f', 'concat',
-            '-safe', '0',
-            '-r', str(fps),
-            '-i', list_file,
-            '-c:v', 'libx264',
-            '-preset', 'medium',
-            '-crf', '23',
+            self._ffmpeg, '-y',
+            *input_args,
+            *video_args,
             '-pix_fmt', 'yuv420p',
-            '-loglevel', 'quiet',
+            '-loglevel', 'error',
             temp_video_path
         ]
 
         try:
-            convert_start = time.time()
-            subprocess.run(cmd, check=True, capture_output=True, text=True)
-            convert_time = time.time() - convert_start
+            convert_start = _t()
+            self.run_ffmpeg_encode(cmd, video_args, 23)
+            convert_time = _t() - convert_start
 
             if not os.path.exists(temp_video_path):
                 self.log("错误: ffmpeg未能生成视频")
-                os.remove(list_file)
+                if list_file:
+                    os.remove(list_file)
                 return False
 
             # 如果有音频，合并音频
             if audio_path and os.path.exists(audio_path):
                 merge_cmd = [
-                    'ffmpeg', '-y',
+                    self._ffmpeg, '-y',
                     '-i', temp_video_path,
                     '-i', audio_path,
+                    '-map', '0:v:0',
+                    '-map', '1:a:0?',
                     '-c:v', 'copy',
                     '-c:a', 'aac',
                     '-b:a', '192k',
-                    '-loglevel', 'quiet',
+                    '-loglevel', 'error',
                     output_path
                 ]
 
-                merge_start = time.time()
-                subprocess.run(merge_cmd, check=True, capture_output=True, text=True)
-                merge_time = time.time() - merge_start
+                merge_start = _t()
+                self.run_ffmpeg(merge_cmd)
+                merge_time = _t() - merge_start
 
                 os.remove(temp_video_path)
-                total_time = time.time() - start_time
+                total_time = _t() - start_time
                 self.log(
                     f"视频生成成功，总耗时: {total_time:.2f}秒 (转换: {convert_time:.2f}s, 合并: {merge_time:.2f}s)")
             else:
                 shutil.move(temp_video_path, output_path)
-                total_time = time.time() - start_time
+                total_time = _t() - start_time
                 self.log(f"视频生成成功，总耗时: {total_time:.2f}秒 (转换: {convert_time:.2f}s)")
 
-            os.remove(list_file)
+            if list_file:
+                os.remove(list_file)
             return True
 
-        except subprocess.CalledProcessError as e:
-            self.log(f"ffmpeg生成视频失败: {e.stderr}")
-            if os.path.exists(list_file):
+        except (subprocess.CalledProcessError, OSError) as e:
+            self.log(f"ffmpeg生成视频失败: {getattr(e, 'stderr', None) or e}")
+            if list_file and os.path.exists(list_file):
                 os.remove(list_file)
             return False
 
@@ -2647,9 +3206,9 @@ class APISRVideoProcessor:
         """直接处理视频片段（不进行重复帧检测）"""
         segment_name = os.path.basename(segment_path)
         self.log(f"直接处理片段 {segment_index}: {segment_name}")
-        segment_start_time = time.time()
+        segment_start_time = _t()
 
-        if self.test_mode_var.get():
+        if self.test_mode:
             self.log("测试模式：不进行超分辨率处理")
             return None, None
 
@@ -2671,17 +3230,21 @@ class APISRVideoProcessor:
         if has_audio:
             audio_name = segment_name.replace('.mp4', '.aac')
             audio_path = os.path.join(self.temp_base_dir, "02_audio", audio_name)
-            try:
-                video.audio.write_audiofile(audio_path, verbose=False)
+            # 优先使用ffmpeg（流复制，不行再编码为AAC），都失败时再用moviepy重新编码
+            if self.extract_audio(segment_path, audio_path):
                 self.log("音频提取成功")
-            except Exception as e:
-                self.log(f"音频提取失败: {e}")
-                audio_path = None
-                has_audio = False
+            else:
+                try:
+                    video.audio.write_audiofile(audio_path, verbose=False)
+                    self.log("音频提取成功")
+                except Exception as e:
+                    self.log(f"音频提取失败: {e}")
+                    audio_path = None
+                    has_audio = False
 
         # 计算输出尺寸
-        scale = int(self.scale_var.get())
-        downsample_threshold = int(self.downsample_threshold.get())
+        scale = self.sr_scale
+        downsample_threshold = self.downsample_px
 
         short_side = min(height, width)
         if downsample_threshold != -1 and short_side > downsample_threshold:
@@ -2726,32 +3289,29 @@ class APISRVideoProcessor:
 
             # 直接处理模式不支持暂停，所以不需要检查暂停状态
 
-            # 注意：moviepy返回的是RGB格式，需要转换为BGR进行超分处理
-            # 转换为BGR格式
-            img_lr_bgr = cv2.cvtColor(img_lr, cv2.COLOR_RGB2BGR)
+            # 注意：moviepy读写都是RGB格式，直接以RGB送入超分，不做颜色转换
 
             # 下采样（如果需要）
             if rescale_factor != 1:
-                img_lr_bgr = cv2.resize(img_lr_bgr, (int(width / rescale_factor), int(height / rescale_factor)),
-                                        interpolation=cv2.INTER_LINEAR)
+                img_lr = cv2.resize(img_lr, (int(width / rescale_factor), int(height / rescale_factor)),
+                                    interpolation=cv2.INTER_LINEAR)
 
             # 裁剪（如果需要）
-            if self.crop_for_4x_var.get() and scale == 4:
-                h, w, _ = img_lr_bgr.shape
+            if self.crop_for_4x and scale == 4:
+                h, w, _ = img_lr.shape
                 if h % 4 != 0:
-                    img_lr_bgr = img_lr_bgr[:4 * (h // 4), :, :]
+                    img_lr = img_lr[:4 * (h // 4), :, :]
                 if w % 4 != 0:
-                    img_lr_bgr = img_lr_bgr[:, :4 * (w // 4), :]
+                    img_lr = img_lr[:, :4 * (w // 4), :]
 
             # 处理帧
-            process_start = time.time()
-            sr_frame = self.process_single_frame(img_lr_bgr)
-            frame_process_time = time.time() - process_start
+            process_start = _t()
+            sr_frame = self.process_single_frame(img_lr, rgb=True)
+            frame_process_time = _t() - process_start
             total_frame_time += frame_process_time
 
-            # 写入帧（注意：moviepy需要RGB格式）
-            sr_frame_rgb = cv2.cvtColor(sr_frame, cv2.COLOR_BGR2RGB)
-            writer.write_frame(sr_frame_rgb)
+            # 写入帧
+            writer.write_frame(sr_frame)
 
             # 更新进度
             frames_processed += 1
@@ -2770,33 +3330,31 @@ class APISRVideoProcessor:
                 avg_frame_time = total_frame_time / (frame_idx + 1)
                 self.log(f"已处理 {frame_idx + 1}/{total_frames} 帧，平均每帧耗时: {avg_frame_time:.3f}秒")
 
-            # 每处理50帧清理一次内存
-            if frame_idx % 50 == 0:
-                self.cleanup_memory()
-
         # 关闭写入器和视频
         writer.close()
         video.close()
 
         # 记录片段处理统计
-        segment_elapsed = time.time() - segment_start_time
+        segment_elapsed = _t() - segment_start_time
         avg_frame_time = total_frame_time / max(frames_processed, 1)
 
         self.log(f"直接处理完成: {segment_name}，总耗时: {segment_elapsed:.2f}秒")
         self.log(f"  处理帧数: {frames_processed}，平均每帧耗时: {avg_frame_time:.3f}秒")
+        self.segment_stats.append(SegmentStats(sr_time=total_frame_time, frames=frames_processed,
+                                               elapsed=segment_elapsed))
 
         # 如果有立即合并功能，调用合并
-        if self.immediate_merge_var.get() and not self.test_mode_var.get():
+        if self.immediate_merge and not self.test_mode:
             self.update_immediate_merge()
 
         return processed_segment_path, audio_path if has_audio else None
 
     def update_immediate_merge(self):
         """更新立即合并视频 - 检查04_processed_segments文件夹并合并到05_immediate_merge"""
-        if not self.immediate_merge_var.get() or self.test_mode_var.get():
+        if not self.immediate_merge or self.test_mode:
             return None
 
-        start_time = time.time()
+        start_time = _t()
 
         # 获取路径
         processed_segments_dir = os.path.join(self.temp_base_dir, "04_processed_segments")
@@ -2890,7 +3448,7 @@ class APISRVideoProcessor:
             # 使用ffprobe获取视频信息
             try:
                 probe_cmd = [
-                    'ffprobe', '-v', 'error',
+                    self._ffprobe, '-v', 'error',
                     '-select_streams', 'v:0',
                     '-show_entries', 'stream=width,height,r_frame_rate,codec_name,pix_fmt',
                     '-of', 'json',
@@ -2936,45 +3494,44 @@ class APISRVideoProcessor:
 
             with open(list_file, 'w', encoding='utf-8') as f:
                 for video_file in video_files_to_merge:
-                    f.write(f"file '{os.path.abspath(video_file)}'\n")
+                    f.write(f"file '{video_file}'\n")
 
             # 使用ffmpeg合并视频，并重新编码以确保编码参数一致
             # 关键修改：不使用简单的copy，而是重新编码以确保一致性
+            video_args = self.h264_args(18)
             cmd = [
-                'ffmpeg', '-y',
+                self._ffmpeg, '-y',
                 '-f', 'concat',
                 '-safe', '0',
                 '-i', list_file,
-                '-c:v', 'libx264',  # 强制使用h264编码
-                '-preset', 'medium',  # 平衡编码速度和质量
-                '-crf', '18',  # 较高的质量（18是视觉无损）
+                *video_args,  # h264编码（有硬件编码器时使用硬件编码）
                 '-r', str(fps),  # 设置帧率
                 '-pix_fmt', pix_fmt,  # 使用相同的像素格式
                 '-c:a', 'aac',  # 音频编码为aac
                 '-b:a', '192k',  # 音频比特率
                 '-strict', 'experimental',
-                '-loglevel', 'quiet',
+                '-loglevel', 'error',
                 new_merged_video_path
             ]
 
-            merge_start = time.time()
+            merge_start = _t()
             try:
-                subprocess.run(cmd, check=True, capture_output=True, text=True)
+                self.run_ffmpeg_encode(cmd, video_args, 18)
             except subprocess.CalledProcessError as e:
                 self.log(f"重新编码合并失败，尝试使用流复制: {e.stderr}")
                 # 如果重新编码失败，尝试使用流复制
                 cmd_fallback = [
-                    'ffmpeg', '-y',
+                    self._ffmpeg, '-y',
                     '-f', 'concat',
                     '-safe', '0',
                     '-i', list_file,
                     '-c', 'copy',
-                    '-loglevel', 'quiet',
+                    '-loglevel', 'error',
                     new_merged_video_path
                 ]
-                subprocess.run(cmd_fallback, check=True, capture_output=True, text=True)
+                self.run_ffmpeg(cmd_fallback)
 
-            merge_time = time.time() - merge_start
+            merge_time = _t() - merge_start
 
             # 检查生成的视频文件
             if not os.path.exists(new_merged_video_path):
@@ -3003,7 +3560,7 @@ class APISRVideoProcessor:
                 except Exception as e:
                     self.log(f"删除旧的合并视频失败: {e}")
 
-            elapsed = time.time() - start_time
+            elapsed = _t() - start_time
             self.log(
                 f"立即合成成功: 合并了 {len(unmerged_segments)} 个新片段，耗时: {elapsed:.2f}秒 (合并: {merge_time:.2f}s)")
             self.log(f"新的合并视频: {os.path.basename(new_merged_video_path)}")
@@ -3024,7 +3581,10 @@ class APISRVideoProcessor:
         try:
             self.log(
                 f"开始处理视频 {self.current_video_index + 1}/{len(self.input_paths)}: {os.path.basename(video_path)}")
-            video_start_time = time.time()
+            video_start_time = _t()
+
+            # 本视频处理期间使用固定的参数快照
+            self._snapshot_settings()
 
             # 设置视频基础名称
             self.video_base_name = Path(video_path).stem
@@ -3039,7 +3599,7 @@ class APISRVideoProcessor:
                 self.log("注意：当前为测试模式文件夹")
 
             # 检测进度
-            if self.enable_dup_detect_var.get():
+            if self.dup_enabled:
                 # 启用重复帧检测模式：从03和04文件夹检测进度
                 next_segment, current_frame, processed_segments = self.detect_progress_from_folders()
                 self.current_segment_index = next_segment - 1 if next_segment > 0 else 0
@@ -3079,13 +3639,13 @@ class APISRVideoProcessor:
             self.update_dup_info(self.dup_frame_count)
 
             # 步骤1: 加载模型
-            if not self.test_mode_var.get():
+            if not self.test_mode:
                 self.log("=" * 60)
                 self.log("步骤1: 加载模型...")
                 self.update_progress(0)
-                model_load_start = time.time()
+                model_load_start = _t()
                 self.generator = self.load_model()
-                model_load_time = time.time() - model_load_start
+                model_load_time = _t() - model_load_start
                 self.log(f"模型加载完成，耗时: {model_load_time:.2f}秒")
                 self.update_progress(5)
             else:
@@ -3111,9 +3671,9 @@ class APISRVideoProcessor:
                     self.log("=" * 60)
                     self.log("步骤2: 分割视频...")
                     segment_duration = float(self.segment_duration.get())
-                    split_start = time.time()
+                    split_start = _t()
                     self.segments = self.split_video_by_keyframes(video_path, segment_duration, temp_dirs['base'])
-                    split_time = time.time() - split_start
+                    split_time = _t() - split_start
 
                     self.total_segments = len(self.segments)
                     self.log(f"视频分割完成，共{len(self.segments)}段，耗时: {split_time:.2f}秒")
@@ -3131,9 +3691,9 @@ class APISRVideoProcessor:
                 self.log("=" * 60)
                 self.log("步骤2: 分割视频...")
                 segment_duration = float(self.segment_duration.get())
-                split_start = time.time()
+                split_start = _t()
                 self.segments = self.split_video_by_keyframes(video_path, segment_duration, temp_dirs['base'])
-                split_time = time.time() - split_start
+                split_time = _t() - split_start
 
                 self.total_segments = len(self.segments)
                 self.log(f"视频分割完成，共{len(self.segments)}段，耗时: {split_time:.2f}秒")
@@ -3152,9 +3712,7 @@ class APISRVideoProcessor:
             self.log("步骤3: 处理视频片段...")
 
             all_processed_segments = []
-            total_segment_time = 0
-            total_frames_processed = 0
-            total_dup_count = 0
+            self.segment_stats = []
 
             for i in range(self.current_segment_index, len(self.segments)):
                 # 检查是否被停止
@@ -3175,18 +3733,14 @@ class APISRVideoProcessor:
                     continue
 
                 self.log(f"处理片段 {i + 1}/{len(self.segments)}: {segment_name}")
-                segment_start = time.time()
 
-                if not self.enable_dup_detect_var.get() and not self.test_mode_var.get():
+                if not self.dup_enabled and not self.test_mode:
                     # 直接处理模式（不进行重复帧检测）
                     processed_segment_path, audio_path = self.process_segment_directly(segment, i + 1)
                 else:
                     # 逐帧处理模式（带重复帧检测或测试模式）
                     processed_segment_path, audio_path = self.process_segment_frames(segment, i + 1)
 
-                segment_time = time.time() - segment_start
-                total_segment_time += segment_time
-
                 # 检查是否被停止
                 if self.stopped:
                     break
@@ -3194,7 +3748,7 @@ class APISRVideoProcessor:
                 if processed_segment_path:
                     # 所有非测试模式都会生成视频片段
                     all_processed_segments.append(processed_segment_path)
-                elif self.test_mode_var.get():
+                elif self.test_mode:
                     self.log(f"测试模式：片段 {i + 1} 处理完成，帧文件已保存")
 
                 # 更新进度
@@ -3213,10 +3767,10 @@ class APISRVideoProcessor:
                 return False
 
             # 步骤4: 如果处理了多个片段且不是测试模式，拼接视频
-            if not self.test_mode_var.get():
+            if not self.test_mode:
                 # 检查是否有立即合成的最终视频
                 merge_dir = os.path.join(self.temp_base_dir, "05_immediate_merge")
-                if self.immediate_merge_var.get() and os.path.exists(merge_dir):
+                if self.immediate_merge and os.path.exists(merge_dir):
                     # 查找最新的合并视频
                     merged_files = []
                     for f in os.listdir(merge_dir):
@@ -3232,10 +3786,10 @@ class APISRVideoProcessor:
                         output_filename = f"{self.video_base_name}_super_resolved.mp4"
                         final_output = os.path.join(self.output_dir.get(), output_filename)
 
-                        merge_start = time.time()
+                        merge_start = _t()
                         # 确保视频重新编码以确保兼容性
                         if self.concatenate_videos_reencode([latest_merged], final_output):
-                            merge_time = time.time() - merge_start
+                            merge_time = _t() - merge_start
 
                             self.update_progress(95)
                             self.log(f"使用立即合成的视频作为最终输出: {final_output}，编码耗时: {merge_time:.2f}秒")
@@ -3260,9 +3814,9 @@ class APISRVideoProcessor:
                                 self.concatenate_videos_reencode(all_processed_segments, final_output)
                             else:
                                 # 如果只有一个片段，直接复制
-                                copy_start = time.time()
+                                copy_start = _t()
                                 shutil.copy2(all_processed_segments[0], final_output)
-                                copy_time = time.time() - copy_start
+                                copy_time = _t() - copy_start
                                 self.log(f"复制单个片段，耗时: {copy_time:.2f}秒")
 
                             self.update_progress(95)
@@ -3282,9 +3836,9 @@ class APISRVideoProcessor:
                             self.concatenate_videos_reencode(all_processed_segments, final_output)
                         else:
                             # 如果只有一个片段，直接复制
-                            copy_start = time.time()
+                            copy_start = _t()
                             shutil.copy2(all_processed_segments[0], final_output)
-                            copy_time = time.time() - copy_start
+                            copy_time = _t() - copy_start
                             self.log(f"复制单个片段，耗时: {copy_time:.2f}秒")
 
                         self.update_progress(95)
@@ -3302,7 +3856,7 @@ class APISRVideoProcessor:
             self.update_progress(100)
 
             # 在视频处理完成后，自动清理所有临时文件，只保留处理好的视频
-            if not self.test_mode_var.get():
+            if not self.test_mode:
                 # 检查是否成功生成了最终视频
                 output_filename = f"{self.video_base_name}_super_resolved.mp4"
                 final_output = os.path.join(self.output_dir.get(), output_filename)
@@ -3316,52 +3870,43 @@ class APISRVideoProcessor:
                 self.log("测试模式：保留临时文件供检查")
 
             # 视频处理完成统计
-            total_video_time = time.time() - video_start_time
-
-            # 计算详细时间统计
-            if self.enable_dup_detect_var.get() and not self.test_mode_var.get():
-                total_dup_time = 0  # 这里需要从片段处理中累计
-                total_sr_time = total_segment_time - total_dup_time  # 估算
-            else:
-                total_dup_time = 0
-                total_sr_time = total_segment_time
-
-            avg_frame_time = total_segment_time / max(total_frames_processed, 1) if total_frames_processed > 0 else 0
-
-            self.log("=" * 60)
-            self.log("视频处理完成详细统计:")
-            self.log(f"  视频名称: {os.path.basename(video_path)}")
-            self.log(f"  总处理时间: {total_video_time:.2f}秒")
-
-            if not self.test_mode_var.get():
-                self.log(f"  模型加载时间: {model_load_time if 'model_load_time' in locals() else 0:.2f}秒")
-                self.log(f"  视频分割时间: {split_time if 'split_time' in locals() else 0:.2f}秒")
-                self.log(f"  片段处理总时间: {total_segment_time:.2f}秒")
-
-                if self.enable_dup_detect_var.get():
-                    self.log(f"    重复帧检测时间: {total_dup_time:.2f}秒")
-                    self.log(f"    超分辨率处理时间: {total_sr_time:.2f}秒")
-                    self.log(f"  总计重复帧: {self.dup_frame_count}个")
-
-                if total_frames_processed > 0:
-                    self.log(f"  处理总帧数: {total_frames_processed}")
-                    self.log(f"  平均每帧处理时间: {avg_frame_time:.3f}秒")
-
-                    # 计算处理速度
-                    processing_speed = total_frames_processed / total_segment_time if total_segment_time > 0 else 0
-                    self.log(f"  处理速度: {processing_speed:.1f} 帧/秒")
+            total_video_time = _t() - video_start_time
+
+            # 汇总各片段统计（一次numpy求和）
+            stats_arr = np.array([st.as_tuple() for st in self.segment_stats], dtype=np.float64).reshape(-1, 5)
+            total_dup_time, total_sr_time, total_frames, _, total_segment_time = stats_arr.sum(axis=0)
+            total_frames = int(total_frames)
+            avg_frame_time = total_segment_time / total_frames if total_frames > 0 else 0
+            speed = total_frames / total_segment_time if total_segment_time > 0 else 0
+
+            lines = ["=" * 60,
+                     "视频处理完成详细统计:",
+                     f"  视频名称: {os.path.basename(video_path)}",
+                     f"  总处理时间: {total_video_time:.2f}秒"]
+            if not self.test_mode:
+                lines += [f"  模型加载时间: {model_load_time if 'model_load_time' in locals() else 0:.2f}秒",
+                          f"  视频分割时间: {split_time if 'split_time' in locals() else 0:.2f}秒",
+                          f"  片段处理总时间: {total_segment_time:.2f}秒"]
+                if self.dup_enabled:
+                    lines += [f"    重复帧检测时间: {total_dup_time:.2f}秒",
+                              f"    超分辨率处理时间: {total_sr_time:.2f}秒",
+                              f"  总计重复帧: {self.dup_frame_count}个"]
+                if total_frames > 0:
+                    lines += [f"  处理总帧数: {total_frames}",
+                              f"  平均每帧处理时间: {avg_frame_time:.3f}秒",
+                              f"  处理速度: {speed:.1f} 帧/秒"]
             else:
-                self.log("测试模式统计:")
-                self.log(f"  总检测时间: {total_video_time:.2f}秒")
-                self.log(f"  总计检测到重复帧: {self.dup_frame_count}个")
-                self.log(f"  检测总帧数: {total_frames_processed}")
-                if total_frames_processed > 0:
-                    avg_detection_time = total_segment_time / total_frames_processed
-                    self.log(f"  平均每帧检测时间: {avg_detection_time:.3f}秒")
+                lines += ["测试模式统计:",
+                          f"  总检测时间: {total_video_time:.2f}秒",
+                          f"  总计检测到重复帧: {self.dup_frame_count}个",
+                          f"  检测总帧数: {total_frames}"]
+                if total_frames > 0:
+                    lines.append(f"  平均每帧检测时间: {avg_frame_time:.3f}秒")
+            self.log("\n".join(lines))
 
             self.log("=" * 60)
 
-            if self.test_mode_var.get():
+            if self.test_mode:
                 self.log(f"测试模式完成！测试结果保存在: {temp_dirs['base']}")
             else:
                 self.log(f"处理完成！输出文件: {self.video_base_name}_super_resolved.mp4")
@@ -3376,7 +3921,7 @@ class APISRVideoProcessor:
             self.update_dup_info(0)
 
             # 清空历史缓存
-            self.clear_history_cache()
+            self.clear_history_cache(release=True)
 
             return True
 
@@ -3385,27 +3930,30 @@ class APISRVideoProcessor:
             import traceback
             self.log(f"错误详情:\n{traceback.format_exc()}")
             return False
+        finally:
+            # 释放本视频的传输缓冲区
+            self.release_transfer_buffers()
 
     def cleanup_temp_after_success(self, temp_dirs):
         """成功处理后自动清理临时文件"""
         try:
-            # 只保留04_processed_segments目录，清理其他临时目录
-            dirs_to_clean = [
-                temp_dirs['original_segments'],
-                temp_dirs['audio'],
-                temp_dirs['segment_frames'],
-                os.path.join(temp_dirs['base'], "05_immediate_merge")
-            ]
+            # 只保留04_processed_segments目录，清理其他临时目录（目录名 -> 路径）
+            dirs_to_clean = {
+                "01_original_segments": temp_dirs['original_segments'],
+                "02_audio": temp_dirs['audio'],
+                "03_segment_frames": temp_dirs['segment_frames'],
+                "05_immediate_merge": temp_dirs['immediate_merge'],
+            }
 
             cleaned_count = 0
-            for dir_path in dirs_to_clean:
+            for dir_name, dir_path in dirs_to_clean.items():
                 if os.path.exists(dir_path):
                     try:
                         shutil.rmtree(dir_path)
                         cleaned_count += 1
-                        self.log(f"已清理临时目录: {os.path.basename(dir_path)}")
+                        self.log(f"已清理临时目录: {dir_name}")
                     except Exception as e:
-                        self.log(f"清理临时目录时出错({os.path.basename(dir_path)}): {e}")
+                        self.log(f"清理临时目录时出错({dir_name}): {e}")
 
             self.log(f"自动清理完成，共清理 {cleaned_count} 个临时目录")
         except Exception as e:
@@ -3414,7 +3962,7 @@ class APISRVideoProcessor:
     def concatenate_videos_reencode(self, video_list, output_path):
         """重新编码拼接视频片段"""
         self.log("开始重新编码拼接视频片段...")
-        start_time = time.time()
+        start_time = _t()
 
         if not video_list:
             self.log("错误: 没有可用的视频文件")
@@ -3427,7 +3975,7 @@ class APISRVideoProcessor:
             # 获取视频信息
             try:
                 probe_cmd = [
-                    'ffprobe', '-v', 'error',
+                    self._ffprobe, '-v', 'error',
                     '-select_streams', 'v:0',
                     '-show_entries', 'stream=width,height,r_frame_rate,codec_name,pix_fmt',
                     '-of', 'json',
@@ -3464,27 +4012,26 @@ class APISRVideoProcessor:
                 pix_fmt = 'yuv420p'
 
             # 重新编码单个视频
+            video_args = self.h264_args(18)
             cmd = [
-                'ffmpeg', '-y',
+                self._ffmpeg, '-y',
                 '-i', single_video_path,
-                '-c:v', 'libx264',
-                '-preset', 'medium',
-                '-crf', '18',
+                *video_args,
                 '-r', str(fps),
                 '-pix_fmt', pix_fmt,
                 '-c:a', 'aac',
                 '-b:a', '192k',
                 '-strict', 'experimental',
-                '-loglevel', 'quiet',
+                '-loglevel', 'error',
                 output_path
             ]
 
             try:
-                encode_start = time.time()
-                subprocess.run(cmd, check=True, capture_output=True, text=True)
-                encode_time = time.time() - encode_start
+                encode_start = _t()
+                self.run_ffmpeg_encode(cmd, video_args, 18)
+                encode_time = _t() - encode_start
 
-                total_time = time.time() - start_time
+                total_time = _t() - start_time
                 self.log(f"单个视频重新编码完成: {output_path}")
                 self.log(f"  总耗时: {total_time:.2f}秒 (编码: {encode_time:.2f}s)")
                 return True
@@ -3505,14 +4052,14 @@ class APISRVideoProcessor:
 
         with open(list_file, 'w', encoding='utf-8') as f:
             for video in video_list:
-                f.write(f"file '{os.path.abspath(video)}'\n")
+                f.write(f"file '{video}'\n")
 
         # 获取第一个视频的参数
         first_video_path = video_list[0]
 
         try:
             probe_cmd = [
-                'ffprobe', '-v', 'error',
+                self._ffprobe, '-v', 'error',
                 '-select_streams', 'v:0',
                 '-show_entries', 'stream=width,height,r_frame_rate,codec_name,pix_fmt',
                 '-of', 'json',
@@ -3549,29 +4096,28 @@ class APISRVideoProcessor:
             pix_fmt = 'yuv420p'
 
         # 使用ffmpeg拼接并重新编码
+        video_args = self.h264_args(18)
         cmd = [
-            'ffmpeg', '-y',
+            self._ffmpeg, '-y',
             '-f', 'concat',
             '-safe', '0',
             '-i', list_file,
-            '-c:v', 'libx264',
-            '-preset', 'medium',
-            '-crf', '18',
+            *video_args,
             '-r', str(fps),
             '-pix_fmt', pix_fmt,
             '-c:a', 'aac',
             '-b:a', '192k',
             '-strict', 'experimental',
-            '-loglevel', 'quiet',
+            '-loglevel', 'error',
             output_path
         ]
 
         try:
-            concat_start = time.time()
-            subprocess.run(cmd, check=True, capture_output=True, text=True)
-            concat_time = time.time() - concat_start
+            concat_start = _t()
+            self.run_ffmpeg_encode(cmd, video_args, 18)
+            concat_time = _t() - concat_start
 
-            total_time = time.time() - start_time
+            total_time = _t() - start_time
             self.log(f"视频重新编码拼接完成: {output_path}")
             self.log(f"  总耗时: {total_time:.2f}秒 (拼接: {concat_time:.2f}s)")
             return True
@@ -3581,15 +4127,15 @@ class APISRVideoProcessor:
             self.log("尝试使用流复制方式...")
             try:
                 cmd_fallback = [
-                    'ffmpeg', '-y',
+                    self._ffmpeg, '-y',
                     '-f', 'concat',
                     '-safe', '0',
                     '-i', list_file,
                     '-c', 'copy',
-                    '-loglevel', 'quiet',
+                    '-loglevel', 'error',
                     output_path
                 ]
-                subprocess.run(cmd_fallback, check=True, capture_output=True, text=True)
+                self.run_ffmpeg(cmd_fallback)
                 self.log("流复制方式成功")
                 return True
             except subprocess.CalledProcessError as e2:
@@ -3602,31 +4148,32 @@ class APISRVideoProcessor:
     def concatenate_videos(self, video_list, output_path):
         """拼接视频片段（使用流复制，快速但可能有问题）"""
         self.log("开始拼接视频片段（流复制）...")
-        start_time = time.time()
+        start_time = _t()
 
         # 创建临时文件列表
         list_file = tempfile.mktemp(suffix=".txt")
 
         with open(list_file, 'w', encoding='utf-8') as f:
             for video in video_list:
-                f.write(f"file '{os.path.abspath(video)}'\n")
+                f.write(f"file '{video}'\n")
 
         # 使用ffmpeg拼接
         cmd = [
-            'ffmpeg', '-y',
+            self._ffmpeg, '-y',
             '-f', 'concat',
             '-safe', '0',
             '-i', list_file,
             '-c', 'copy',
+            '-loglevel', 'error',
             output_path
         ]
 
         try:
-            concat_start = time.time()
-            subprocess.run(cmd, check=True, capture_output=True, text=True)
-            concat_time = time.time() - concat_start
+            concat_start = _t()
+            self.run_ffmpeg(cmd)
+            concat_time = _t() - concat_start
 
-            total_time = time.time() - start_time
+            total_time = _t() - start_time
             self.log(f"视频拼接完成（流复制）: {output_path}")
             self.log(f"  总耗时: {total_time:.2f}秒 (拼接: {concat_time:.2f}s)")
             return True
@@ -3640,15 +4187,8 @@ class APISRVideoProcessor:
     def process_videos(self):
         """主处理函数 - 处理多个视频"""
         try:
-            # 检查输入
-            if not self.input_paths:
-                messagebox.showerror("错误", "请选择有效的输入视频文件")
-                return
-
+            # 输入、输出目录和模型参数已由validate_settings检查
             output_dir = self.output_dir.get()
-            if not output_dir:
-                messagebox.showerror("错误", "请选择输出目录")
-                return
 
             # 验证参数（添加空值检查）
             try:
@@ -3662,21 +4202,21 @@ class APISRVideoProcessor:
                 history_size = int(history_size_str) if history_size_str else 20
 
                 if hash_threshold < 0 or hash_threshold > 10:
-                    messagebox.showwarning("警告", "哈希相似度阈值必须在0-10之间")
+                    self.show_message("warning", "警告", "哈希相似度阈值必须在0-10之间")
                     self.hash_threshold_var.set("3")
                     return
 
                 if ssim_threshold < 0.9 or ssim_threshold > 1.0:
-                    messagebox.showwarning("警告", "SSIM阈值必须在0.9-1.0之间")
+                    self.show_message("warning", "警告", "SSIM阈值必须在0.9-1.0之间")
                     self.ssim_threshold_var.set("0.98")
                     return
 
                 if history_size < 1 or history_size > 200:
-                    messagebox.showwarning("警告", "历史帧数量必须在1-200之间")
+                    self.show_message("warning", "警告", "历史帧数量必须在1-200之间")
                     self.history_size_var.set("20")
                     return
             except ValueError:
-                messagebox.showerror("错误", "参数格式错误")
+                self.show_message("error", "错误", "参数格式错误")
                 return
 
             # 创建输出目录
@@ -3703,12 +4243,14 @@ class APISRVideoProcessor:
 
             # 处理每个视频
             total_videos = len(self.input_paths)
-            total_start_time = time.time()
+            total_start_time = _t()
 
             self.log("=" * 60)
             self.log(f"开始批量处理 {total_videos} 个视频")
             self.log("=" * 60)
 
+            failed_videos = []  # 处理失败的视频路径
+
             for i in range(self.current_video_index, total_videos):
                 if self.stopped:
                     break
@@ -3717,14 +4259,15 @@ class APISRVideoProcessor:
                 video_path = self.input_paths[i]
 
                 # 更新进度信息
-                self.progress_info.config(text=f"正在处理视频 {i + 1}/{total_videos}: {os.path.basename(video_path)}")
-                self.root.update_idletasks()
+                self.set_progress_info(f"正在处理视频 {i + 1}/{total_videos}: {os.path.basename(video_path)}")
 
                 # 处理单个视频
                 success = self.process_single_video(video_path)
 
                 if not success and not self.stopped:
-                    # 单个视频处理失败，但用户没有停止，继续处理下一个
+                    # 单个视频处理失败，但用户没有停止，记录后继续处理下一个
+                    failed_videos.append(video_path)
+                    self.last_error = f"视频处理失败: {video_path}"
                     self.log(f"视频处理失败，继续处理下一个视频")
                     continue
 
@@ -3737,91 +4280,129 @@ class APISRVideoProcessor:
                 return
 
             # 所有视频处理完成
-            total_elapsed = time.time() - total_start_time
+            total_elapsed = _t() - total_start_time
 
             self.log("=" * 60)
             self.log("批量处理完成统计:")
             self.log(f"  处理视频总数: {total_videos}")
+            if failed_videos:
+                self.log(f"  处理失败: {len(failed_videos)}个")
+                for failed_path in failed_videos:
+                    self.log(f"    {failed_path}")
             self.log(f"  总处理时间: {total_elapsed:.2f}秒")
             self.log(f"  平均每个视频处理时间: {total_elapsed / total_videos:.2f}秒")
             self.log("=" * 60)
 
             if self.test_mode_var.get():
                 self.update_status("测试完成！", "green")
-                messagebox.showinfo("测试完成",
-                                    f"批量测试完成！\n\n"
-                                    f"共处理 {total_videos} 个视频\n"
-                                    f"总耗时: {total_elapsed:.2f}秒\n"
-                                    f"测试结果保存在各视频的临时目录中")
+                self.show_message("info", "测试完成",
+                                  f"批量测试完成！\n\n"
+                                  f"共处理 {total_videos} 个视频\n"
+                                  f"总耗时: {total_elapsed:.2f}秒\n"
+                                  f"测试结果保存在各视频的临时目录中")
             else:
                 self.update_status("批量处理完成！", "green")
-                messagebox.showinfo("完成",
-                                    f"批量处理完成！\n\n"
-                                    f"共处理 {total_videos} 个视频\n"
-                                    f"总耗时: {total_elapsed:.2f}秒\n"
-                                    f"输出目录: {output_dir}")
+                failed_note = f"，其中 {len(failed_videos)} 个失败" if failed_videos else ""
+                self.show_message("info", "完成",
+                                  f"批量处理完成！\n\n"
+                                  f"共处理 {total_videos} 个视频{failed_note}\n"
+                                  f"总耗时: {total_elapsed:.2f}秒\n"
+                                  f"输出目录: {output_dir}")
 
             # 重置状态
             self.current_video_index = 0
 
-            # 执行任务结束后的行为
-            self.log("正在执行任务结束行为...")
-            self.execute_post_action()
+            # 执行任务结束后的行为（无界面模式由调用脚本决定后续操作，不执行关机/关闭等行为）
+            if self.headless:
+                self.log("无界面模式，跳过任务结束行为")
+            else:
+                self.log("正在执行任务结束行为...")
+                self.execute_post_action()
 
         except Exception as e:
             self.log(f"批量处理失败: {str(e)}")
             self.update_status(f"处理失败: {str(e)}", "red")
-            messagebox.showerror("错误", f"处理失败: {str(e)}")
+            self.show_message("error", "错误", f"处理失败: {str(e)}")
         finally:
-            self.processing = False
-            self.paused = False
-            self.stopped = False
-            self.process_btn.config(state='normal')
-            self.pause_btn.config(state='disabled', text="⏸ 暂停")
-            self.stop_btn.config(state='disabled')
-
-            # 清理GPU内存
+            # 先清理GPU内存，再复位状态：复位后就可能开始新一轮处理并加载新模型
             if self.generator and not self.test_mode_var.get():
                 try:
                     # 确保模型从GPU移除
                     self.generator = self.generator.cpu()
                     del self.generator
                     self.generator = None
+                    self._eager_generator = None
                     torch.cuda.empty_cache()
                     torch.cuda.synchronize()  # 等待CUDA操作完成
                     self.log("GPU内存已完全释放")
                 except Exception as e:
                     self.log(f"清理GPU内存时出错: {e}")
 
-    def start_processing(self):
-        """开始处理"""
-        if self.processing:
-            return
+            self.processing = False
+            self.paused = False
+            self.stopped = False
+            self.process_btn.config(state='normal')
+            self.pause_btn.config(state='disabled', text="⏸ 暂停")
+            self.stop_btn.config(state='disabled')
+
+            # 最后再通知等待中的停止/退出操作：置位后线程不再访问任何共享状态
+            self._worker_done.set()
+
+    def validate_settings(self):
+        """开始处理前检查输入、输出目录和模型参数；界面和无界面模式共用，不通过时提示并返回False"""
+        if not self.input_paths:
+            self.show_message("error", "错误", "请选择有效的输入视频文件")
+            return False
+
+        if not self.output_dir.get():
+            self.show_message("error", "错误", "请选择输出目录")
+            return False
 
-        # 验证参数
         try:
             scale = int(self.scale_var.get())
             model = self.model_var.get()
             history_size = int(self.history_size_var.get())
 
+            if model not in self.models:
+                self.show_message("warning", "警告", f"未知模型: {model}")
+                return False
+
             if model in ["GRL", "DAT"] and scale != 4:
-                messagebox.showwarning("警告", f"{model}模型只支持4倍缩放")
+                self.show_message("warning", "警告", f"{model}模型只支持4倍缩放")
                 self.scale_var.set("4")
-                return
+                return False
 
             if scale not in [2, 4]:
-                messagebox.showwarning("警告", "缩放因子必须是2或4")
-                return
+                self.show_message("warning", "警告", "缩放因子必须是2或4")
+                return False
 
             if history_size < 1 or history_size > 200:
-                messagebox.showwarning("警告", "历史帧数量必须在1-200之间")
+                self.show_message("warning", "警告", "历史帧数量必须在1-200之间")
                 self.history_size_var.set("20")
-                return
+                return False
         except ValueError:
-            messagebox.showerror("错误", "参数格式错误")
+            self.show_message("error", "错误", "参数格式错误")
+            return False
+
+        # 测试模式不加载模型，其余情况提前确认权重文件存在，避免批处理开始后才失败
+        if not self.test_mode_var.get():
+            weight_path = self.get_weight_path(model, scale)
+            if not os.path.exists(weight_path):
+                self.show_message("error", "错误", f"权重文件不存在: {weight_path}")
+                return False
+
+        return True
+
+    def start_processing(self):
+        """开始处理"""
+        if self.processing:
+            return
+
+        if not self.validate_settings():
             return
 
         # 在新线程中运行处理
+        self._worker_done.clear()
         self.processing_thread = threading.Thread(target=self.process_videos)
         self.processing_thread.daemon = True
         self.processing_thread.start()
@@ -3837,18 +4418,18 @@ class APISRVideoProcessor:
             return
 
         if self.paused:
-            # 继续处理
-            self.paused = False
+            # 继续处理（在条件锁内修改状态，避免唤醒丢失）
+            with self.pause_cv:
+                self.paused = False
+                self.pause_cv.notify_all()
+
             self.pause_btn.config(text="⏸ 暂停")
             self.update_status("处理中...", "blue")
             self.log("处理继续")
-
-            # 通知暂停的线程继续
-            with self.pause_cv:
-                self.pause_cv.notify_all()
         else:
             # 暂停处理
-            self.paused = True
+            with self.pause_cv:
+                self.paused = True
             self.pause_btn.config(text="▶ 继续")
             self.update_status("已暂停", "orange")
             self.log("处理暂停")
@@ -3858,24 +4439,50 @@ class APISRVideoProcessor:
         if not self.processing:
             return
 
-        response = messagebox.askyesno("停止处理",
-                                       "是否确认停止处理？")
+        if not self.headless:
+            response = messagebox.askyesno("停止处理",
+                                           "是否确认停止处理？")
 
-        if not response:
-            return
+            if not response:
+                return
 
         self.log("正在停止处理...")
         self.update_status("正在停止...", "orange")
-        self.stopped = True
-        self.paused = False  # 确保暂停状态被清除
+        self.abort()
+
+        # 等待处理线程响应（不阻塞Tk主循环）
+        self.wait_worker_done(self._on_stop_finished)
 
+    def abort(self):
+        """请求处理线程尽快停止（可从代码直接调用，不弹对话框）"""
         # 通知暂停的线程继续（如果是暂停状态）
         with self.pause_cv:
+            self.stopped = True
+            self.paused = False  # 确保暂停状态被清除
             self.pause_cv.notify_all()
 
-        # 等待处理线程响应
-        time.sleep(0.5)
+    def wait_worker_done(self, callback, timeout=5.0):
+        """在Tk主循环中等待处理线程完全退出后执行回调
 
+        超过timeout秒仍未退出时只提示一次并继续等待，不会在线程仍在运行时复位界面或销毁窗口
+        """
+        deadline = _t() + timeout
+        warned = False
+
+        def poll():
+            nonlocal warned
+            if self._worker_done.is_set():
+                callback()
+                return
+            if not warned and _t() >= deadline:
+                warned = True
+                self.log("处理线程仍在退出中（可能正在处理当前帧），继续等待...")
+            self.root.after(50, poll)
+
+        poll()
+
+    def _on_stop_finished(self):
+        """处理线程停止后的界面复位"""
         self.log("处理已停止")
         self.update_status("已停止", "orange")
 
@@ -3902,34 +4509,62 @@ class APISRVideoProcessor:
 
     def on_closing(self):
         """关闭窗口时的清理"""
-        # 保存配置
-        self.save_config()
+        # 取消待执行的延迟保存，立即保存配置
+        if self._save_after_id is not None:
+            self.root.after_cancel(self._save_after_id)
+            self._save_after_id = None
+        self.save_config(durable=True)
 
         if self.processing:
-            response = messagebox.askyesno("退出",
-                                           "处理仍在进行中，是否确认退出？\n\n"
-                                           "退出后进度将不会保存，下次需要重新开始处理。")
+            if not self.headless:
+                response = messagebox.askyesno("退出",
+                                               "处理仍在进行中，是否确认退出？\n\n"
+                                               "退出后进度将不会保存，下次需要重新开始处理。")
 
-            if not response:
-                return
+                if not response:
+                    return
 
             self.log("正在停止处理并退出...")
             self.processing = False
-            self.stopped = True
-            self.paused = False
+            self.abort()
 
-            # 通知暂停的线程继续（如果是暂停状态）
-            with self.pause_cv:
-                self.pause_cv.notify_all()
+            # 给线程时间响应，退出后再销毁窗口
+            self.wait_worker_done(self._destroy)
+            return
 
-            time.sleep(1.0)  # 给线程更多时间响应
+        self._destroy()
 
+    def _destroy(self):
+        """关闭后台IO线程池并销毁窗口"""
+        self._io_pool.shutdown(wait=False)
+        self._writer_pool.shutdown(wait=True)
         self.root.destroy()
 
 
 def main():
     """主函数"""
     app = APISRVideoProcessor()
+
+    if app.headless:
+        # 无界面批处理：APISR_HEADLESS=1 python ApisrUI.py video1.mp4 video2.mp4 ...
+        app.root.withdraw()
+        # 保持命令行给出的顺序；不是文件的路径跳过并提示
+        app.input_paths = []
+        for path in sys.argv[1:]:
+            if os.path.isfile(path):
+                app.input_paths.append(path)
+            else:
+                app.log(f"跳过（不是文件）: {path}")
+        if not app.input_paths:
+            print("用法: APISR_HEADLESS=1 python ApisrUI.py <视频文件> [...]")
+            sys.exit(2)
+        if not app.output_dir.get():
+            app.output_dir.set(str(Path(app.input_paths[0]).parent / "APISR_Output"))
+        if not app.validate_settings():
+            sys.exit(2)
+        app.process_videos()
+        sys.exit(1 if app.last_error else 0)
+
     app.run()
 
 